@@ -191,6 +191,103 @@
     updateCartCount();
   };
 
+  const searchIndex = { data: null, pending: null, bitmaps: new Map() };
+
+  // Mirrors catalog_fingerprint() in scripts/build_search_index.py: 32-bit FNV-1a over the indexed fields.
+  const catalogFingerprint = (data) => {
+    const fields = (data.vendors || []).map((vendor) => `${vendor.id}\0${vendor.name}`);
+    Object.entries(data.courses || {}).forEach(([vendorId, courses]) => {
+      courses.forEach((course) => {
+        const values = [`${vendorId}-${course.id}`, course.title, course.focus, course.level, course.delivery];
+        fields.push(values.map((value) => value || "").join("\0"));
+      });
+    });
+    let value = 0x811c9dc5;
+    for (const char of fields.join("\n")) {
+      value = Math.imul(value ^ char.codePointAt(0), 0x01000193) >>> 0;
+    }
+    return value.toString(16).padStart(8, "0");
+  };
+
+  const loadSearchIndex = () => {
+    if (!searchIndex.pending) {
+      searchIndex.pending = fetch("assets/js/search-index.json")
+        .then((response) => (response.ok ? response.json() : null))
+        .then((data) => {
+          // An index built from an older data.js would hide courses added since, so it is only used when it matches.
+          const catalog = window.CourseData;
+          const courses = catalog ? Object.values(catalog.courses || {}).reduce((sum, list) => sum + list.length, 0) : -1;
+          if (data && data.courses === courses && data.catalog === catalogFingerprint(catalog)) {
+            searchIndex.data = { ...data, words: Math.ceil(data.docs.length / 32) };
+          }
+          return searchIndex.data;
+        })
+        .catch(() => null);
+    }
+    return searchIndex.pending;
+  };
+
+  const tokenize = (text) =>
+    text
+      .normalize("NFKD")
+      .replace(/\p{M}/gu, "")
+      .toLowerCase()
+      .split(/[^a-z0-9]+/)
+      .filter(Boolean);
+
+  const tokenBitmap = (index, token) => {
+    if (!searchIndex.bitmaps.has(token)) {
+      const words = new Uint32Array(index.words);
+      (index.grams[token.slice(0, index.gramLength)] || []).forEach((tokenId) => {
+        if (!index.tokens[tokenId].includes(token)) return;
+        index.postings[tokenId].forEach((doc) => {
+          words[doc >> 5] |= 1 << (doc & 31);
+        });
+      });
+      searchIndex.bitmaps.set(token, words);
+    }
+    return searchIndex.bitmaps.get(token);
+  };
+
+  // Returns candidate course uids in catalog order, or null until a matching index has loaded (and for queries
+  // without tokens, where the facets alone narrow nothing a catalog scan would not). Callers still apply their
+  // substring match to the candidates, so results are the same before and after the index arrives.
+  const searchCourseIndex = (query, { vendor = "", level = "", delivery = "", vendorNames = false } = {}) => {
+    const index = searchIndex.data;
+    const tokens = tokenize(query);
+    if (!index || !tokens.length) return null;
+    let result = null;
+    const intersect = (words) => {
+      if (!result) {
+        result = Uint32Array.from(words);
+      } else {
+        result.forEach((value, i) => {
+          result[i] = value & words[i];
+        });
+      }
+    };
+    tokens.forEach((token) => {
+      const words = Uint32Array.from(tokenBitmap(index, token));
+      if (vendorNames) {
+        Object.entries(index.vendorTokens).forEach(([vendorId, names]) => {
+          if (!names.some((name) => name.includes(token))) return;
+          (index.facets.vendor[vendorId] || []).forEach((value, i) => {
+            words[i] |= value;
+          });
+        });
+      }
+      intersect(words);
+    });
+    [
+      ["vendor", vendor],
+      ["level", level],
+      ["delivery", delivery]
+    ].forEach(([facet, value]) => {
+      if (value) intersect(index.facets[facet][value] || new Uint32Array(index.words));
+    });
+    return index.docs.filter((uid, doc) => result[doc >> 5] & (1 << (doc & 31)));
+  };
+
   const renderVendorCourseLists = () => {
     const lists = $$('[data-course-list]');
     if (!lists.length || !window.CourseData) return;
@@ -234,7 +331,9 @@
         const level = levelSelect?.value || "";
         const delivery = deliverySelect?.value || "";
 
-        const filtered = courses.filter((course) => {
+        const indexed = searchCourseIndex(search, { vendor: vendorId, level, delivery });
+        const candidates = indexed ? indexed.map((uid) => courseMap.get(uid)).filter(Boolean) : courses;
+        const filtered = candidates.filter((course) => {
           const matchesSearch =
             !search ||
             course.title.toLowerCase().includes(search) ||
@@ -283,6 +382,7 @@
       };
 
       if (searchInput) {
+        searchInput.addEventListener("focus", () => loadSearchIndex().then(() => searchInput.value.trim() && render()), { once: true });
         searchInput.addEventListener("input", render);
         searchInput.addEventListener("keydown", (event) => {
           if (event.key === "Enter") {
@@ -324,6 +424,7 @@
         uid: `${vendorId}-${course.id}`
       }))
     );
+    const courseByUid = new Map(allCourses.map((course) => [course.uid, course]));
 
     const unique = (items) => Array.from(new Set(items)).filter(Boolean);
     if (vendorSelect) {
@@ -392,7 +493,8 @@
           label: vendor.name
         }));
 
-      const courseMatches = allCourses
+      const indexed = searchCourseIndex(query, { vendorNames: true });
+      const courseMatches = (indexed ? indexed.map((uid) => courseByUid.get(uid)).filter(Boolean) : allCourses)
         .filter(
           (course) =>
             course.title.toLowerCase().includes(query) ||
@@ -417,7 +519,9 @@
       const level = levelSelect?.value || "";
       const delivery = deliverySelect?.value || "";
 
-      const filtered = allCourses.filter((course) => {
+      const indexed = searchCourseIndex(search, { vendor, level, delivery, vendorNames: true });
+      const candidates = indexed ? indexed.map((uid) => courseByUid.get(uid)).filter(Boolean) : allCourses;
+      const filtered = candidates.filter((course) => {
         const matchesSearch =
           !search ||
           course.title.toLowerCase().includes(search) ||
@@ -458,7 +562,7 @@
       $$("[data-add-to-cart]", finder).forEach((button) => {
         button.addEventListener("click", () => {
           const courseId = button.dataset.courseId;
-          const course = allCourses.find((item) => item.uid === courseId);
+          const course = courseByUid.get(courseId);
           if (course) addToCart(course);
         });
       });
@@ -467,6 +571,17 @@
     };
 
     if (searchInput) {
+      searchInput.addEventListener(
+        "focus",
+        () =>
+          loadSearchIndex().then(() => {
+            if (searchInput.value.trim()) {
+              updateSuggestions();
+              render();
+            }
+          }),
+        { once: true }
+      );
       searchInput.addEventListener("input", () => {
         updateSuggestions();
         render();
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import re
+import sys
+import unicodedata
+from typing import Dict, Iterable, List
+
+DATA_PATH = Path("assets/js/data.js")
+INDEX_PATH = Path("assets/js/search-index.json")
+FACETS = ("vendor", "level", "delivery")
+# Every substring of a token up to this length is a key; longer queries share a bucket the client narrows with includes.
+GRAM_LENGTH = 3
+TOKEN_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+# Only non-ASCII characters can be combining marks, so the per-character check skips plain text.
+NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+
+
+def load_course_data(path: Path = DATA_PATH) -> dict:
+    source = path.read_text(encoding="utf-8").strip()
+    prefix = "window.CourseData ="
+    if not source.startswith(prefix):
+        raise ValueError(f"{path} does not start with {prefix!r}")
+    return json.loads(source[len(prefix) :].rstrip(";"))
+
+
+def _drop_combining(match: re.Match) -> str:
+    return "" if unicodedata.combining(match.group()) else match.group()
+
+
+def tokenize(text: str) -> List[str]:
+    # Mirrors tokenize() in assets/js/app.js: strip accents, lowercase, split on non-alphanumerics.
+    decomposed = unicodedata.normalize("NFKD", text)
+    folded = NON_ASCII_RE.sub(_drop_combining, decomposed).lower()
+    return [token for token in TOKEN_SPLIT_RE.split(folded) if token]
+
+
+def catalog_fingerprint(data: dict) -> str:
+    """32-bit FNV-1a over every field the index is built from; app.js computes the same value to detect a stale index."""
+    # Mirrors catalogFingerprint() in assets/js/app.js, which hashes code points the same way.
+    fields = [f"{vendor['id']}\0{vendor['name']}" for vendor in data.get("vendors", [])]
+    for vendor_id, courses in data.get("courses", {}).items():
+        for course in courses:
+            values = (f"{vendor_id}-{course['id']}", course["title"], course["focus"], course.get("level"), course.get("delivery"))
+            fields.append("\0".join(value or "" for value in values))
+    value = 0x811C9DC5
+    for char in "\n".join(fields):
+        value = ((value ^ ord(char)) * 0x01000193) & 0xFFFFFFFF
+    return f"{value:08x}"
+
+
+def bitmap(doc_ids: Iterable[int], count: int) -> List[int]:
+    words = [0] * ((count + 31) // 32)
+    for doc_id in doc_ids:
+        words[doc_id >> 5] |= 1 << (doc_id & 31)
+    return words
+
+
+def build_index(data: dict) -> dict:
+    """Build the token postings, substring map and facet bitmaps consumed by app.js."""
+    docs: List[str] = []
+    postings: Dict[str, set] = {}
+    facet_docs: Dict[str, Dict[str, List[int]]] = {facet: {} for facet in FACETS}
+
+    for vendor_id, courses in data.get("courses", {}).items():
+        for course in courses:
+            doc_id = len(docs)
+            docs.append(f"{vendor_id}-{course['id']}")
+            for token in tokenize(f"{course['title']} {course['focus']}"):
+                postings.setdefault(token, set()).add(doc_id)
+            for facet, value in (("vendor", vendor_id), ("level", course.get("level")), ("delivery", course.get("delivery"))):
+                if value:
+                    facet_docs[facet].setdefault(value, []).append(doc_id)
+
+    tokens = sorted(postings)
+    # Substring keys (not just prefixes) so "ops" finds "cloudops", matching the catalog scan used before the index loads.
+    grams: Dict[str, List[int]] = {}
+    for token_id, token in enumerate(tokens):
+        for start in range(len(token)):
+            for end in range(start + 1, min(len(token), start + GRAM_LENGTH) + 1):
+                bucket = grams.setdefault(token[start:end], [])
+                if not bucket or bucket[-1] != token_id:
+                    bucket.append(token_id)
+
+    return {
+        "version": 3,
+        "gramLength": GRAM_LENGTH,
+        # app.js ignores the index (and scans the catalog) when these no longer match window.CourseData.
+        "courses": len(docs),
+        "catalog": catalog_fingerprint(data),
+        "docs": docs,
+        "tokens": tokens,
+        "postings": [sorted(postings[token]) for token in tokens],
+        "grams": grams,
+        "vendorTokens": {vendor["id"]: tokenize(vendor["name"]) for vendor in data.get("vendors", [])},
+        "facets": {
+            facet: {value: bitmap(ids, len(docs)) for value, ids in values.items()} for facet, values in facet_docs.items()
+        },
+    }
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Build the prebuilt course search index from data.js.")
+    parser.add_argument("--data", type=Path, default=DATA_PATH)
+    parser.add_argument("--output", type=Path, default=INDEX_PATH)
+    parser.add_argument("--check", action="store_true", help="fail if the index is out of date with data.js (nothing is written)")
+    args = parser.parse_args(argv)
+
+    index = build_index(load_course_data(args.data))
+    text = json.dumps(index, separators=(",", ":"))
+    if args.check:
+        current = args.output.read_text(encoding="utf-8") if args.output.exists() else ""
+        if current != text:
+            print(f"{args.output} is out of date; run scripts/build_search_index.py", file=sys.stderr)
+            sys.exit(1)
+        print(f"{args.output} is up to date.")
+        return
+    args.output.write_text(text, encoding="utf-8")
+    print(f"Indexed {len(index['docs'])} courses, {len(index['tokens'])} tokens -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
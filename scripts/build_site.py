@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import hashlib
+import json
+from pathlib import Path
+import re
+import sys
+import time
+from typing import Dict, List, Set, Tuple
+
+from critical_css import APP_JS, STYLESHEET, critical_css, load_stylesheet, page_usage
+
+SITE_DIR = Path("site")
+PAGES_DIR = SITE_DIR / "pages"
+PARTIALS_DIR = SITE_DIR / "partials"
+LAYOUT = SITE_DIR / "layout.html"
+OUTPUT_DIR = Path(".")
+MANIFEST_PATH = SITE_DIR / ".build-manifest.json"
+# A tag alone on its line replaces the whole line, so partials keep their own indentation and newlines.
+TAG_RE = re.compile(r"^[ \t]*(\{%.*?%\}|\{\{.*?\}\})[ \t]*\n|(\{%.*?%\}|\{\{.*?\}\})", re.M)
+VAR_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+INCLUDE_RE = re.compile(r'\{%\s*include\s+"([^"]+)"(?:\s+(if|unless)\s+(\w+))?\s*%\}')
+FRONT_MATTER_RE = re.compile(r"---\n(.*?)\n---\n", re.S)
+# Below this many stale pages, worker start-up costs more than rendering serially.
+PARALLEL_THRESHOLD = 64
+# Attributes app.js looks for before reading window.CourseData; pages without them skip data.js.
+COURSE_WIDGETS = ("data-course-list", "data-course-finder", "data-lms-form")
+DATA_JS = Path("assets/js/data.js")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+@dataclass
+class Template:
+    path: Path
+    # Literal strings interleaved with ("var", name) and ("include", partial, "if"/"unless", variable) nodes.
+    nodes: List[object]
+
+
+_TEMPLATE_CACHE: Dict[Path, Tuple[Tuple[int, int], Template]] = {}
+
+
+def parse_template(path: Path, text: str) -> Template:
+    nodes: List[object] = []
+    position = 0
+    for match in TAG_RE.finditer(text):
+        if match.start() > position:
+            nodes.append(text[position : match.start()])
+        tag = match.group(1) or match.group(2)
+        var = VAR_RE.fullmatch(tag)
+        include = INCLUDE_RE.fullmatch(tag)
+        if var:
+            nodes.append(("var", var.group(1)))
+        elif include:
+            nodes.append(("include", include.group(1), include.group(2), include.group(3)))
+        else:
+            raise TemplateError(f"{path}: unknown tag {tag}")
+        position = match.end()
+    if position < len(text):
+        nodes.append(text[position:])
+    return Template(path, nodes)
+
+
+def load_template(path: Path) -> Template:
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _TEMPLATE_CACHE.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    template = parse_template(path, path.read_text(encoding="utf-8"))
+    _TEMPLATE_CACHE[path] = (stamp, template)
+    return template
+
+
+def render_template(template: Template, context: Dict[str, str], deps: Set[Path], stack=()) -> str:
+    deps.add(template.path)
+    out: List[str] = []
+    for node in template.nodes:
+        if isinstance(node, str):
+            out.append(node)
+        elif node[0] == "var":
+            if node[1] not in context:
+                raise TemplateError(f"{template.path}: undefined variable {node[1]!r}")
+            out.append(context[node[1]])
+        else:
+            _, name, mode, condition = node
+            if mode and bool(context.get(condition)) != (mode == "if"):
+                continue
+            included = PARTIALS_DIR / name
+            if included in stack:
+                raise TemplateError(f"{template.path}: recursive include of {name}")
+            out.append(render_template(load_template(included), context, deps, stack + (included,)))
+    return "".join(out)
+
+
+def read_page(path: Path) -> Tuple[Dict[str, str], str]:
+    text = path.read_text(encoding="utf-8")
+    match = FRONT_MATTER_RE.match(text)
+    if not match:
+        raise TemplateError(f"{path}: missing front matter")
+    context = {}
+    for line in match.group(1).splitlines():
+        key, sep, value = line.partition(":")
+        if not sep:
+            raise TemplateError(f"{path}: malformed front matter line {line!r}")
+        context[key.strip()] = value.strip()
+    return context, text[match.end() :]
+
+
+@dataclass
+class PageReport:
+    name: str
+    inline_css: int
+    skipped_data_js: bool
+
+    def saved(self) -> int:
+        # Bytes no longer fetched before first render: the full stylesheet is replaced by the inline
+        # subset, and data.js is not downloaded at all on pages without course widgets.
+        saved = STYLESHEET.stat().st_size - self.inline_css if self.inline_css else 0
+        return saved + (DATA_JS.stat().st_size if self.skipped_data_js else 0)
+
+
+def render_page(page: Path, inline_css=True) -> Tuple[str, str, List[str], PageReport]:
+    """Render one page through the layout; return (output name, html, dependency paths, report)."""
+    context, content = read_page(page)
+    deps: Set[Path] = set()
+    # Page bodies may use includes and their own front-matter variables too.
+    context["content"] = render_template(parse_template(page, content), context, deps)
+    context["course_data"] = "1" if page_usage(context["content"]).attributes.intersection(COURSE_WIDGETS) else ""
+    context["critical_css"] = ""
+    layout = load_template(LAYOUT)
+    html = render_template(layout, context, deps)
+    if inline_css:
+        # The subset depends on everything the layout adds (header, footer, modal), so it is taken from a first render.
+        rules, runtime = load_stylesheet()
+        context["critical_css"] = critical_css(rules, page_usage(html, runtime))
+        html = render_template(layout, context, deps)
+        deps.update((STYLESHEET, APP_JS))
+    report = PageReport(page.name, len(context["critical_css"].encode("utf-8")), not context["course_data"])
+    return page.name, html, sorted(str(dep) for dep in deps), report
+
+
+class _Digests(dict):
+    def __missing__(self, path: str) -> str | None:
+        try:
+            digest = hashlib.sha1(Path(path).read_bytes()).hexdigest()
+        except FileNotFoundError:
+            digest = None
+        self[path] = digest
+        return digest
+
+
+def load_manifest() -> dict:
+    try:
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def is_stale(page: Path, entry: dict | None, digests: _Digests, output_dir: Path) -> bool:
+    if not entry:
+        return True
+    if digests[str(output_dir / page.name)] != entry["output"]:
+        return True
+    return any(digests[dep] != digest for dep, digest in entry["deps"].items())
+
+
+def render_all(pages: List[Path], workers: int | None, inline_css=True) -> List[Tuple[str, str, List[str], PageReport]]:
+    render = partial(render_page, inline_css=inline_css)
+    if len(pages) < PARALLEL_THRESHOLD or workers == 1:
+        return [render(page) for page in pages]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render, pages, chunksize=16))
+
+
+def build(output_dir: Path = OUTPUT_DIR, force=False, workers: int | None = None, inline_css=True) -> Tuple[List[PageReport], int]:
+    """Render pages whose page file, layout, partials, stylesheet or output changed since the last build."""
+    pages = sorted(PAGES_DIR.glob("*.html"))
+    manifest = load_manifest()
+    code = b"".join(path.read_bytes() for path in (Path(__file__), Path(__file__).with_name("critical_css.py")))
+    builder = hashlib.sha1(code).hexdigest() + ("" if inline_css else "-no-critical-css")
+    if manifest.get("builder") != builder:
+        force = True
+    entries: Dict[str, dict] = {} if force else manifest.get("pages", {})
+    digests = _Digests()
+    stale = [page for page in pages if force or is_stale(page, entries.get(page.name), digests, output_dir)]
+
+    reports: List[PageReport] = []
+    for name, html, deps, report in render_all(stale, workers, inline_css):
+        reports.append(report)
+        output = output_dir / name
+        data = html.encode("utf-8")
+        # Unchanged output keeps its mtime, so deploy tools only see pages that really changed.
+        if digests[str(output)] != hashlib.sha1(data).hexdigest():
+            output.write_bytes(data)
+        digests.pop(str(output))
+        entries[name] = {"output": digests[str(output)], "deps": {dep: digests[dep] for dep in deps}}
+
+    names = {page.name for page in pages}
+    MANIFEST_PATH.write_text(
+        json.dumps({"builder": builder, "pages": {name: entry for name, entry in sorted(entries.items()) if name in names}}, indent=2) + "\n",
+        encoding="utf-8",
+    )
+    return reports, len(pages)
+
+
+def check(output_dir: Path = OUTPUT_DIR, workers: int | None = None, inline_css=True) -> List[str]:
+    """Return the names of generated pages that differ from a fresh render."""
+    pages = sorted(PAGES_DIR.glob("*.html"))
+    stale = []
+    for name, html, _, _ in render_all(pages, workers, inline_css):
+        output = output_dir / name
+        if not output.exists() or output.read_bytes() != html.encode("utf-8"):
+            stale.append(name)
+    return stale
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Build the top-level HTML pages from site/layout.html, partials and page bodies.")
+    parser.add_argument("--force", action="store_true", help="rebuild every page regardless of the manifest")
+    parser.add_argument("--check", action="store_true", help="fail if any generated page is out of date (nothing is written)")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count; 1 renders serially)")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR)
+    parser.add_argument("--no-critical-css", dest="inline_css", action="store_false", help="link the full stylesheet instead of inlining each page's subset")
+    parser.add_argument("--report", action="store_true", help="print inline CSS size and bytes saved for every rebuilt page")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        if args.check:
+            stale = check(args.output, args.workers, args.inline_css)
+            if stale:
+                print(f"Out of date: {', '.join(stale)} (run scripts/build_site.py)", file=sys.stderr)
+                sys.exit(1)
+            print("All pages up to date.")
+            return
+        reports, total = build(args.output, force=args.force, workers=args.workers, inline_css=args.inline_css)
+    except TemplateError as exc:
+        print(f"FAIL {exc}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = (time.perf_counter() - started) * 1000
+    if args.report:
+        for report in reports:
+            data_js = ", data.js skipped" if report.skipped_data_js else ""
+            print(f"{report.name:<36} inline CSS {report.inline_css / 1024:5.1f} KB{data_js:<18} saved {report.saved() / 1024:5.1f} KB")
+    saved = sum(report.saved() for report in reports)
+    print(f"Built {len(reports)} of {total} pages in {elapsed:.0f} ms ({saved / 1024:.1f} KB saved before first render).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+import re
+from typing import Dict, List, Set, Tuple
+
+STYLESHEET = Path("assets/css/styles.css")
+APP_JS = Path("assets/js/app.js")
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+# What app.js adds at runtime counts as present on every page: state classes it toggles (menus,
+# reveal-on-scroll, modals), class names it assigns, and the markup it renders from template literals
+# (course cards, cart rows, finder suggestions).
+JS_CLASS_RE = re.compile(r"classList\.(?:add|toggle)\(\s*[\"']([\w-]+)[\"']|(?:className\s*=|setAttribute\(\s*[\"']class[\"']\s*,)\s*[\"']([\w\s-]+)[\"']")
+JS_TEMPLATE_RE = re.compile(r"`([^`]*)`")
+JS_INTERPOLATION_RE = re.compile(r"\$\{[^{}]*\}")
+PSEUDO_RE = re.compile(r"::?[\w-]+(?:\([^)]*\))?")
+SIMPLE_RE = re.compile(r"([.#]?)([\w-]+)|\[([\w-]+)[^\]]*\]|\*")
+COMBINATOR_RE = re.compile(r"\s*[>+~]\s*|\s+")
+ANIMATION_RE = re.compile(r"animation(?:-name)?\s*:\s*([^;]+)")
+WHITESPACE_RE = re.compile(r"\s+")
+PUNCTUATION_RE = re.compile(r"\s*([{}:;,>])\s*")
+# In selectors a space before ':' is a descendant combinator, so only combinators are tightened.
+SELECTOR_PUNCTUATION_RE = re.compile(r"\s*([>+~,])\s*")
+
+
+@dataclass
+class Rule:
+    selectors: List[str]
+    body: str
+
+
+@dataclass
+class AtRule:
+    prelude: str
+    # Nested rules for @media/@supports; raw body for @keyframes and friends.
+    rules: List[Rule] = field(default_factory=list)
+    body: str = ""
+
+
+def _minify(text: str) -> str:
+    return PUNCTUATION_RE.sub(r"\1", WHITESPACE_RE.sub(" ", text)).replace(";}", "}").strip().rstrip(";")
+
+
+def _minify_selector(selector: str) -> str:
+    return SELECTOR_PUNCTUATION_RE.sub(r"\1", WHITESPACE_RE.sub(" ", selector)).strip()
+
+
+def _block_end(css: str, start: int) -> int:
+    depth = 0
+    for i in range(start, len(css)):
+        if css[i] == "{":
+            depth += 1
+        elif css[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    raise ValueError("unbalanced braces in stylesheet")
+
+
+def parse_stylesheet(css: str) -> List[Rule | AtRule]:
+    css = COMMENT_RE.sub("", css)
+    items: List[Rule | AtRule] = []
+    position = 0
+    while True:
+        brace = css.find("{", position)
+        if brace == -1:
+            break
+        prelude = css[position:brace].strip()
+        end = _block_end(css, brace)
+        body = css[brace + 1 : end]
+        if prelude.startswith("@"):
+            if prelude.startswith(("@media", "@supports")):
+                items.append(AtRule(prelude, [item for item in parse_stylesheet(body) if isinstance(item, Rule)]))
+            else:
+                items.append(AtRule(prelude, body=body))
+        else:
+            items.append(Rule([selector.strip() for selector in prelude.split(",")], body))
+        position = end + 1
+    return items
+
+
+class _UsageCollector(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.tags: Set[str] = set()
+        self.classes: Set[str] = set()
+        self.ids: Set[str] = set()
+        self.attributes: Set[str] = set()
+
+    def handle_starttag(self, tag, attrs):
+        self.tags.add(tag)
+        for name, value in attrs:
+            self.attributes.add(name)
+            if name == "class" and value:
+                self.classes.update(value.split())
+            elif name == "id" and value:
+                self.ids.add(value)
+
+    handle_startendtag = handle_starttag
+
+
+@dataclass
+class PageUsage:
+    tags: Set[str]
+    classes: Set[str]
+    ids: Set[str]
+    attributes: Set[str]
+
+    def may_match(self, selector: str) -> bool:
+        # Deliberately generous: every compound has to reference things present somewhere on the page,
+        # but their nesting is not checked. Extra rules only cost bytes; missing ones would flash unstyled.
+        for compound in COMBINATOR_RE.split(PSEUDO_RE.sub("", selector)):
+            for match in SIMPLE_RE.finditer(compound):
+                prefix, name, attribute = match.group(1), match.group(2), match.group(3)
+                if attribute:
+                    if attribute not in self.attributes:
+                        return False
+                elif name is None:
+                    continue
+                elif prefix == ".":
+                    if name not in self.classes:
+                        return False
+                elif prefix == "#":
+                    if name not in self.ids:
+                        return False
+                elif name.lower() not in self.tags:
+                    return False
+        return True
+
+
+def page_usage(html: str, runtime: PageUsage | None = None) -> PageUsage:
+    collector = _UsageCollector()
+    collector.feed(html)
+    collector.close()
+    usage = PageUsage(collector.tags, collector.classes, collector.ids, collector.attributes)
+    if runtime is not None:
+        usage.tags |= runtime.tags
+        usage.classes |= runtime.classes
+        usage.ids |= runtime.ids
+        usage.attributes |= runtime.attributes
+    return usage
+
+
+def runtime_usage(script: str) -> PageUsage:
+    """Tags, classes, ids and attributes app.js can put on any page, from its class calls and HTML templates."""
+    # Interpolations are dropped, so class="${x}" contributes nothing and the static tokens around them survive.
+    templates = (JS_INTERPOLATION_RE.sub("", body).replace('\\"', '"') for body in JS_TEMPLATE_RE.findall(script))
+    usage = page_usage("".join(templates))
+    for toggled, assigned in JS_CLASS_RE.findall(script):
+        usage.classes.update(toggled.split() + assigned.split())
+    return usage
+
+
+def critical_css(stylesheet: List[Rule | AtRule], usage: PageUsage) -> str:
+    """Return the minified subset of `stylesheet` that can apply to a page with `usage`."""
+    out: List[str] = []
+    keyframes: Dict[str, str] = {}
+    animations: Set[str] = set()
+
+    def keep(rule: Rule) -> str:
+        selectors = [selector for selector in rule.selectors if usage.may_match(selector)]
+        if not selectors:
+            return ""
+        for value in ANIMATION_RE.findall(rule.body):
+            animations.update(value.replace(",", " ").split())
+        return f"{','.join(_minify_selector(selector) for selector in selectors)}{{{_minify(rule.body)}}}"
+
+    for item in stylesheet:
+        if isinstance(item, Rule):
+            out.append(keep(item))
+        elif item.rules:
+            inner = "".join(keep(rule) for rule in item.rules)
+            if inner:
+                out.append(f"{_minify(item.prelude)}{{{inner}}}")
+        elif item.prelude.startswith("@keyframes"):
+            keyframes[item.prelude.split()[1]] = f"{_minify(item.prelude)}{{{_minify(item.body)}}}"
+        else:
+            out.append(f"{_minify(item.prelude)}{{{_minify(item.body)}}}")
+    out.extend(css for name, css in keyframes.items() if name in animations)
+    return "".join(out)
+
+
+_STYLESHEET_CACHE: Dict[Tuple[Path, Path], Tuple[tuple, List[Rule | AtRule], PageUsage]] = {}
+
+
+def load_stylesheet(path: Path = STYLESHEET, script: Path = APP_JS) -> Tuple[List[Rule | AtRule], PageUsage]:
+    """Parse the stylesheet and collect what app.js renders at runtime, cached until either file changes."""
+    stamp = tuple((p.stat().st_mtime_ns, p.stat().st_size) for p in (path, script))
+    cached = _STYLESHEET_CACHE.get((path, script))
+    if cached and cached[0] == stamp:
+        return cached[1], cached[2]
+    rules = parse_stylesheet(path.read_text(encoding="utf-8"))
+    runtime = runtime_usage(script.read_text(encoding="utf-8"))
+    _STYLESHEET_CACHE[(path, script)] = (stamp, rules, runtime)
+    return rules, runtime
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+import io
+import json
+import os
+from pathlib import Path
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from ebook_watch import file_stamp, generator_modules, load_generator
+
+SOCKET_PATH = Path("/tmp/learning-curve-ebooks.sock")
+GENERATOR = Path(__file__).resolve().with_name("generate_ebooks.py")
+
+
+@dataclass
+class Stats:
+    jobs: int = 0
+    errors: int = 0
+    reloads: int = 0
+    latencies: List[float] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.jobs += 1
+            self.latencies.append(seconds)
+            del self.latencies[:-1000]
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            samples = sorted(self.latencies)
+
+        def pct(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3) if samples else 0
+
+        return {"jobs": self.jobs, "errors": self.errors, "reloads": self.reloads, "p50_ms": pct(0.5), "p99_ms": pct(0.99)}
+
+
+class Generator:
+    """The loaded generator namespace, reloaded when it or any module it imports changes on disk.
+
+    CMS edits land in generate_ebooks.py, so a warm process would otherwise keep rendering the
+    catalog it started with. Checking costs one stat per module file.
+    """
+
+    def __init__(self, path: Path = GENERATOR):
+        self.path = path
+        self.stamps: Dict[Path, Tuple[int, int] | None] = {}
+        self.namespace: dict = {}
+        self.ebooks: Dict[str, dict] = {}
+
+    def current(self) -> bool:
+        """Reload if needed and return whether a reload happened."""
+        if self.stamps and all(file_stamp(path) == stamp for path, stamp in self.stamps.items()):
+            return False
+        try:
+            stamps = {path: file_stamp(path) for path in generator_modules(self.path)}
+            namespace = load_generator(self.path)
+        except Exception as exc:
+            # A half-saved edit must not take the daemon down; keep serving the last good catalog.
+            if not self.namespace:
+                raise
+            raise ValueError(f"generator reload failed, still serving the previous catalog: {exc!r}") from None
+        self.stamps, self.namespace = stamps, namespace
+        self.ebooks = {ebook["slug"]: ebook for ebook in namespace["EBOOKS"]}
+        return True
+
+
+def validate(job) -> dict:
+    if not isinstance(job, dict):
+        raise ValueError("job must be a JSON object")
+    if job.get("op") == "stats":
+        return job
+    if not isinstance(job.get("slug"), str):
+        raise ValueError("job needs a 'slug' string")
+    sections = job.get("sections")
+    if sections is not None and not (isinstance(sections, list) and all(isinstance(name, str) for name in sections)):
+        raise ValueError("'sections' must be a list of section names")
+    if job.get("output") is not None and not isinstance(job["output"], str):
+        raise ValueError("'output' must be a path string")
+    return job
+
+
+def render(generator: Generator, job: dict) -> tuple:
+    """Render one job and return (pdf bytes or None, metrics)."""
+    ebook = generator.ebooks.get(job["slug"])
+    if ebook is None:
+        raise ValueError(f"unknown ebook {job['slug']!r}")
+    namespace = generator.namespace
+    if job.get("preview"):
+        sections = namespace["PREVIEW_SECTIONS"]
+    else:
+        sections = job["sections"] if job.get("sections") is not None else namespace["FULL_SECTIONS"]
+    started = time.perf_counter()
+    pdf = namespace["layout_ebook"](ebook, bool(job.get("compress")), sections)
+    laid_out = time.perf_counter()
+    if job.get("output"):
+        output = Path(job["output"])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        pdf.build(output)
+        data = None
+        size = output.stat().st_size
+    else:
+        buffer = io.BytesIO()
+        size = pdf.write(buffer)
+        data = buffer.getvalue()
+    finished = time.perf_counter()
+    metrics = {
+        "pages": len(pdf.pages),
+        "bytes": size,
+        "layout_ms": round((laid_out - started) * 1000, 3),
+        "write_ms": round((finished - laid_out) * 1000, 3),
+        "total_ms": round((finished - started) * 1000, 3),
+    }
+    return data, metrics
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # Layout is CPU-bound Python, so jobs run one at a time; connections still queue concurrently.
+    render_lock = threading.Lock()
+    stats = Stats()
+    generator = Generator()
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """One JSON job per line; each reply is a JSON header line, followed by `bytes` of PDF when no output path was given."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            started = time.perf_counter()
+            data = None
+            try:
+                job = validate(json.loads(line))
+                if job.get("op") == "stats":
+                    reply = {"ok": True, **self.server.stats.as_dict()}
+                else:
+                    with self.server.render_lock:
+                        if self.server.generator.current():
+                            with self.server.stats.lock:
+                                self.server.stats.reloads += 1
+                        data, metrics = render(self.server.generator, job)
+                    self.server.stats.record(time.perf_counter() - started)
+                    reply = {"ok": True, "slug": job["slug"], "inline": data is not None, **metrics}
+            except Exception as exc:
+                # Anything a job or a CMS edit can trigger (e.g. a KeyError from an ebook missing a field)
+                # is reported to the client; the connection and the daemon carry on.
+                with self.server.stats.lock:
+                    self.server.stats.errors += 1
+                message = str(exc) if isinstance(exc, (ValueError, OSError)) else f"{type(exc).__name__}: {exc}"
+                reply = {"ok": False, "error": message}
+            self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+            if data is not None:
+                self.wfile.write(data)
+            self.wfile.flush()
+
+
+def serve(args):
+    if args.socket.exists():
+        args.socket.unlink()
+    started = time.perf_counter()
+    generator = DaemonServer.generator
+    generator.current()
+    # Render everything once so font subsets, image streams and translation tables are cached before the first job.
+    for ebook in generator.ebooks.values():
+        generator.namespace["layout_ebook"](ebook).write(io.BytesIO())
+    previous_umask = os.umask(0o077)
+    try:
+        server = DaemonServer(str(args.socket), JobHandler)
+    finally:
+        os.umask(previous_umask)
+    print(f"Serving {len(generator.ebooks)} ebooks on {args.socket} (warm in {(time.perf_counter() - started) * 1000:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        args.socket.unlink(missing_ok=True)
+        print(json.dumps(server.stats.as_dict()))
+
+
+def request(sock_path: Path, job: dict) -> tuple:
+    """Send one job to a running daemon and return (reply, pdf bytes or None)."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(sock_path))
+        sock.sendall(json.dumps(job).encode("utf-8") + b"\n")
+        stream = sock.makefile("rb")
+        line = stream.readline()
+        if not line.strip():
+            raise ConnectionError(f"daemon at {sock_path} closed the connection without replying")
+        reply = json.loads(line)
+        data = stream.read(reply["bytes"]) if reply.get("inline") else None
+    return reply, data
+
+
+def render_command(args):
+    job = {"slug": args.slug, "preview": args.preview, "compress": args.compress}
+    if args.sections:
+        job["sections"] = [name.strip() for name in args.sections.split(",") if name.strip()]
+    if args.output and not args.inline:
+        job["output"] = str(args.output.resolve())
+    started = time.perf_counter()
+    reply, data = request(args.socket, job)
+    elapsed = (time.perf_counter() - started) * 1000
+    if not reply["ok"]:
+        print(f"FAIL {reply['error']}", file=sys.stderr)
+        sys.exit(1)
+    if data is not None:
+        if args.output:
+            args.output.write_bytes(data)
+        else:
+            sys.stdout.buffer.write(data)
+            return
+    print(
+        f"{args.slug}: {reply['pages']} pages, {reply['bytes']} bytes, layout {reply['layout_ms']:.1f} ms, "
+        f"write {reply['write_ms']:.1f} ms, round trip {elapsed:.1f} ms",
+        file=sys.stderr,
+    )
+
+
+def stats_command(args):
+    reply, _ = request(args.socket, {"op": "stats"})
+    print(json.dumps(reply))
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Keep the ebook generator warm and render jobs over a Unix socket.")
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the daemon")
+    serve_parser.set_defaults(func=serve)
+
+    render_parser = commands.add_parser("render", help="render one ebook through a running daemon")
+    render_parser.add_argument("slug")
+    render_parser.add_argument("--output", type=Path, help="PDF path (default: write the bytes to stdout)")
+    render_parser.add_argument("--inline", action="store_true", help="stream the bytes back even when --output is set")
+    render_parser.add_argument("--sections", help="comma-separated sections to render")
+    render_parser.add_argument("--preview", action="store_true")
+    render_parser.add_argument("--compress", action="store_true")
+    render_parser.set_defaults(func=render_command)
+
+    stats_parser = commands.add_parser("stats", help="print job count and latency percentiles")
+    stats_parser.set_defaults(func=stats_command)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
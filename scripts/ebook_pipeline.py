@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import io
+import queue
+import threading
+import time
+from typing import Callable, List
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    busy: float = 0.0
+    items: int = 0
+    wall: float = 0.0
+
+    @property
+    def utilization(self) -> float:
+        return self.busy / self.wall if self.wall else 0.0
+
+
+class EncodedPdf:
+    """A serialized PDF that sinks can write like a PdfBuilder."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def write(self, out) -> int:
+        return out.write(self.data)
+
+    def build(self, output_path):
+        output_path.write_bytes(self.data)
+
+
+def run_pipeline(ebooks: List[dict], layout: Callable, sink, depth=2, suffix="") -> List[StageStats]:
+    """Run layout -> serialize/compress -> output as three threads joined by bounded queues.
+
+    At most `depth` finished layouts and `depth` serialized PDFs are buffered between stages,
+    which caps memory while letting the output stage's I/O overlap the CPU-bound stages.
+    """
+    laid_out: queue.Queue = queue.Queue(maxsize=depth)
+    encoded: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    stats = [StageStats("layout"), StageStats("serialize"), StageStats("write")]
+
+    def put(q: queue.Queue, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(q: queue.Queue):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def layout_stage():
+        for ebook in ebooks:
+            started = time.perf_counter()
+            pdf = layout(ebook)
+            stats[0].busy += time.perf_counter() - started
+            stats[0].items += 1
+            put(laid_out, (f"{ebook['slug']}{suffix}.pdf", pdf))
+            if stop.is_set():
+                return
+
+    def serialize_stage():
+        while True:
+            item = get(laid_out)
+            if item is _DONE:
+                return
+            name, pdf = item
+            started = time.perf_counter()
+            buffer = io.BytesIO()
+            pdf.write(buffer)
+            result = EncodedPdf(buffer.getvalue())
+            stats[1].busy += time.perf_counter() - started
+            stats[1].items += 1
+            put(encoded, (name, result))
+
+    def write_stage():
+        while True:
+            item = get(encoded)
+            if item is _DONE:
+                return
+            name, pdf = item
+            started = time.perf_counter()
+            sink.add(name, pdf)
+            stats[2].busy += time.perf_counter() - started
+            stats[2].items += 1
+
+    def run(stage: Callable, downstream: queue.Queue | None):
+        try:
+            stage()
+        except BaseException as exc:
+            errors.append(exc)
+            stop.set()
+        finally:
+            if downstream is not None:
+                put(downstream, _DONE)
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=run, args=(layout_stage, laid_out), name="layout", daemon=True),
+        threading.Thread(target=run, args=(serialize_stage, encoded), name="serialize", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    run(write_stage, None)
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    for stage in stats:
+        stage.wall = wall
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def report(stats: List[StageStats]):
+    bottleneck = max(stats, key=lambda stage: stage.busy)
+    for stage in stats:
+        marker = "  <- bottleneck" if stage is bottleneck else ""
+        print(f"{stage.name:<10} {stage.items:4d} items  busy {stage.busy * 1000:8.1f} ms  {stage.utilization:6.1%}{marker}")
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from build_search_index import tokenize
+
+TEXT_INDEX_PATH = Path("assets/js/ebook-index.json")
+# Headers, stats and sources repeat across ebooks and runs, so each distinct string is tokenized once.
+_TOKEN_CACHE: Dict[str, List[str]] = {}
+
+
+class TextIndex:
+    """Inverted index of the words drawn on each ebook page, filled in while the pages are laid out.
+
+    Pages are stored as a bitmask per (token, ebook), so "found on page N" lookups need no PDF parsing.
+    """
+
+    def __init__(self):
+        self.ebooks: List[dict] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+
+    def add_ebook(self, ebook: dict) -> int:
+        self.ebooks.append({"slug": ebook["slug"], "title": ebook["title"], "pages": 0})
+        return len(self.ebooks) - 1
+
+    def add_page(self, doc_id: int, page_number: int, texts: Iterable[str]):
+        entry = self.ebooks[doc_id]
+        entry["pages"] = max(entry["pages"], page_number)
+        bit = 1 << (page_number - 1)
+        tokens = set()
+        for text in texts:
+            if text not in _TOKEN_CACHE:
+                _TOKEN_CACHE[text] = tokenize(text)
+            tokens.update(_TOKEN_CACHE[text])
+        for token in tokens:
+            docs = self.postings.setdefault(token, {})
+            docs[doc_id] = docs.get(doc_id, 0) | bit
+
+    def as_dict(self) -> dict:
+        tokens = sorted(self.postings)
+        return {
+            "version": 1,
+            "ebooks": self.ebooks,
+            "tokens": tokens,
+            # Flat [ebook, page bitmask, ebook, page bitmask, ...] per token; bit 0 is page 1.
+            "postings": [[value for item in sorted(self.postings[token].items()) for value in item] for token in tokens],
+        }
+
+    def merged_with(self, existing: dict) -> TextIndex:
+        """Return a copy of this index that also keeps the ebooks of `existing` (an as_dict() result) it did not render."""
+        merged = TextIndex()
+        rendered = {entry["slug"] for entry in self.ebooks}
+        kept: Dict[int, int] = {}
+        for old_id, entry in enumerate(existing.get("ebooks", [])):
+            if entry["slug"] not in rendered:
+                kept[old_id] = len(merged.ebooks)
+                merged.ebooks.append(entry)
+        for token, flat in zip(existing.get("tokens", []), existing.get("postings", [])):
+            for old_id, mask in zip(flat[::2], flat[1::2]):
+                if old_id in kept:
+                    merged.postings.setdefault(token, {})[kept[old_id]] = mask
+        offset = len(merged.ebooks)
+        merged.ebooks.extend(self.ebooks)
+        for token, docs in self.postings.items():
+            target = merged.postings.setdefault(token, {})
+            for doc_id, mask in docs.items():
+                target[doc_id + offset] = mask
+        return merged
+
+    def write(self, path: Path = TEXT_INDEX_PATH, merge=False):
+        """Write the index; with `merge`, ebooks already in the file that this run did not render are kept."""
+        index = self
+        if merge:
+            try:
+                existing = json.loads(path.read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                existing = {}
+            if existing.get("version") == 1:
+                index = self.merged_with(existing)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(index.as_dict(), separators=(",", ":")), encoding="utf-8")
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+from pathlib import Path
+import re
+import sys
+import time
+from typing import Dict, Iterable, List, Set
+
+import generate_ebooks as generator
+from pdf_sinks import open_sink
+
+VARIANTS_DIR = generator.OUTPUT_DIR / "variants"
+VARIANT_NAME_RE = re.compile(r"[A-Za-z0-9._-]+")
+# Field types overrides are checked against: everything EBOOKS uses, plus the optional fields the builders read.
+FIELD_TYPES: Dict[str, type] = {key: type(value) for ebook in generator.EBOOKS for key, value in ebook.items()}
+FIELD_TYPES.update({"customer": str, "logo": str, "fonts": dict, "kpi_series": dict})
+
+
+class _FieldRecorder(dict):
+    """An ebook dict that remembers which keys a section builder read."""
+
+    def __init__(self, data: dict):
+        super().__init__(data)
+        self.read: Set[str] = set()
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return super().get(key, default)
+
+
+def _render_section(ebook: dict, name: str) -> generator.PdfPage:
+    page = generator.SECTIONS[name](ebook, ebook["accent"])
+    return generator.PdfPage(page.ops, page.images, page.fonts, page.glyphs)
+
+
+class VariantMatrix:
+    """Renders per-customer variants of one base ebook, sharing every page an override does not touch.
+
+    The base ebook is rendered once while recording which fields each section reads. A variant
+    only re-renders the sections that read an overridden field; the rest reuse the base PdfPage,
+    including its already encoded content stream.
+    """
+
+    def __init__(self, base: dict, sections: Iterable[str] = generator.FULL_SECTIONS, compress=False):
+        self.base = base
+        self.sections = generator.resolve_sections(sections)
+        self.compress = compress
+        self.pages: Dict[str, generator.PdfPage] = {}
+        self.fields: Dict[str, Set[str]] = {}
+        self.rendered = 0
+        self.reused = 0
+        for name in self.sections:
+            recorder = _FieldRecorder(base)
+            self.pages[name] = _render_section(recorder, name)
+            self.fields[name] = recorder.read
+
+    def layout(self, overrides: dict) -> generator.PdfBuilder:
+        changed = {key for key, value in overrides.items() if self.base.get(key) != value}
+        ebook = {**self.base, **overrides}
+        pdf = generator.PdfBuilder(compress=self.compress)
+        for name in self.sections:
+            if self.fields[name] & changed:
+                pdf.append_page(_render_section(ebook, name))
+                self.rendered += 1
+            else:
+                pdf.append_page(self.pages[name])
+                self.reused += 1
+        return pdf
+
+
+def _coerce(key: str, value):
+    # CSV cells are strings, so list and dict fields are given as JSON. Unknown fields are decoded when they
+    # look like JSON; known string fields never are, so a subtitle like "[Draft] ..." stays text.
+    expected = FIELD_TYPES.get(key)
+    if isinstance(value, str) and expected is not str and (expected or value.lstrip()[:1] in ("[", "{")):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError(f"field {key!r} must be given as JSON, got {value[:40]!r}") from None
+    if expected and not isinstance(value, expected):
+        raise ValueError(f"field {key!r} must be a {'list' if expected is list else 'JSON object' if expected is dict else 'string'}")
+    return value
+
+
+def load_overrides(path: Path) -> List[dict]:
+    """Read override rows from .csv or .jsonl; every row needs a `variant` name, empty CSV cells are ignored."""
+    if path.suffix == ".jsonl":
+        rows = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    elif path.suffix == ".csv":
+        with path.open(newline="", encoding="utf-8") as handle:
+            rows = [{key: value for key, value in row.items() if value} for row in csv.DictReader(handle)]
+    else:
+        raise ValueError(f"Unsupported override file {path.suffix!r}; use .csv or .jsonl")
+    for number, row in enumerate(rows, 1):
+        if not VARIANT_NAME_RE.fullmatch(str(row.get("variant", ""))):
+            raise ValueError(f"{path}: row {number} needs a 'variant' name made of letters, digits, '.', '_' or '-'")
+    return rows
+
+
+def render_variants(
+    rows: List[dict],
+    base_slug: str | None,
+    sink,
+    sections: Iterable[str] = generator.FULL_SECTIONS,
+    compress=False,
+) -> Dict[str, VariantMatrix]:
+    """Render each row as `<base slug>--<variant>.pdf`, with one VariantMatrix per base ebook."""
+    ebooks = {ebook["slug"]: ebook for ebook in generator.EBOOKS}
+    matrices: Dict[str, VariantMatrix] = {}
+    for row in rows:
+        slug = row.get("base") or base_slug
+        if slug not in ebooks:
+            raise ValueError(f"variant {row['variant']!r}: unknown base ebook {slug!r}")
+        if slug not in matrices:
+            matrices[slug] = VariantMatrix(ebooks[slug], sections, compress)
+        try:
+            overrides = {key: _coerce(key, value) for key, value in row.items() if key not in ("variant", "base")}
+        except ValueError as exc:
+            raise ValueError(f"variant {row['variant']!r}: {exc}") from None
+        sink.add(f"{slug}--{row['variant']}.pdf", matrices[slug].layout(overrides))
+    return matrices
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Render customer variants of ebooks from a table of overrides.")
+    parser.add_argument("overrides", type=Path, help=".csv or .jsonl with a 'variant' column and the fields to override")
+    parser.add_argument("--base", help="base ebook slug for rows without a 'base' column")
+    parser.add_argument("--output-dir", type=Path, default=VARIANTS_DIR)
+    parser.add_argument("--archive", type=Path, help="stream the variants into this .zip or .tar instead")
+    parser.add_argument("--sections", help="comma-separated sections to render (default: all)")
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args(argv)
+
+    sections = generator.FULL_SECTIONS
+    if args.sections is not None:
+        sections = tuple(name.strip() for name in args.sections.split(",") if name.strip())
+    started = time.perf_counter()
+    try:
+        rows = load_overrides(args.overrides)
+        sink = open_sink(args.output_dir, args.archive)
+        try:
+            matrices = render_variants(rows, args.base, sink, sections, args.compress)
+        finally:
+            sink.close()
+    except ValueError as exc:
+        print(f"FAIL {exc}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = (time.perf_counter() - started) * 1000
+    rendered = sum(matrix.rendered for matrix in matrices.values())
+    reused = sum(matrix.reused for matrix in matrices.values())
+    print(f"Rendered {len(rows)} variants in {elapsed:.0f} ms: {rendered} pages laid out, {reused} shared from the base render.")
+
+
+if __name__ == "__main__":
+    main()
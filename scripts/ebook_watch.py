@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import importlib.util
+from pathlib import Path
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+
+# Module-level literals that are ebook data rather than rendering code.
+DATA_NAMES = {"EBOOKS", "GLOBAL_STATS", "SOURCES"}
+
+
+def file_stamp(path: Path) -> Tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def asset_paths(ebook: dict) -> List[Path]:
+    paths = [Path(ebook["logo"])] if ebook.get("logo") else []
+    paths.extend(Path(path) for path in (ebook.get("fonts") or {}).values())
+    return paths
+
+
+def generator_modules(generator: Path) -> List[Path]:
+    """The generator plus every sibling module it imports, directly or through another sibling."""
+    found = [generator]
+    pending = [generator]
+    while pending:
+        tree = ast.parse(pending.pop().read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                path = generator.parent / f"{name}.py"
+                if path.exists() and path not in found:
+                    found.append(path)
+                    pending.append(path)
+    return sorted(found)
+
+
+def code_fingerprint(generator: Path) -> str:
+    # AST dumps ignore comments and formatting, and the data literals are hashed per ebook instead.
+    # Unrelated tools in scripts/ (the site builder, the ingest server) are not part of the fingerprint.
+    digest = hashlib.sha1()
+    for path in generator_modules(generator):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        if path == generator:
+            tree.body = [
+                node
+                for node in tree.body
+                if not (isinstance(node, ast.Assign) and any(getattr(t, "id", None) in DATA_NAMES for t in node.targets))
+            ]
+        digest.update(path.name.encode("utf-8"))
+        digest.update(ast.dump(tree).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def ebook_fingerprints(namespace: dict, code: str) -> Dict[str, str]:
+    shared = repr((namespace["GLOBAL_STATS"], namespace["SOURCES"]))
+    fingerprints = {}
+    for ebook in namespace["EBOOKS"]:
+        assets = [(str(path), file_stamp(path)) for path in asset_paths(ebook)]
+        payload = f"{code}\n{shared}\n{sorted(ebook.items())!r}\n{assets!r}"
+        fingerprints[ebook["slug"]] = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return fingerprints
+
+
+def watched_files(generator: Path, namespace: dict) -> Iterable[Path]:
+    yield from generator_modules(generator)
+    for ebook in namespace["EBOOKS"]:
+        yield from asset_paths(ebook)
+
+
+def load_generator(generator: Path) -> dict:
+    # Drop cached copies of the generator's modules (e.g. pdf_charts) so edits to them are picked up too.
+    # Only those names are touched; __main__ and this module stay as they are.
+    for path in generator_modules(generator):
+        if path.stem != __name__:
+            sys.modules.pop(path.stem, None)
+    spec = importlib.util.spec_from_file_location(generator.stem, generator)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[generator.stem] = module
+    spec.loader.exec_module(module)
+    return vars(module)
+
+
+def watch(generator: Path, output_dir: Path, interval=0.25, debounce=0.2):
+    generator = generator.resolve()
+    namespace = load_generator(generator)
+    fingerprints = ebook_fingerprints(namespace, code_fingerprint(generator))
+    files = list(watched_files(generator, namespace))
+    snapshot = {path: file_stamp(path) for path in files}
+    print(f"Watching {len(files)} files for changes (Ctrl+C to stop).")
+
+    while True:
+        time.sleep(interval)
+        current = {path: file_stamp(path) for path in files}
+        if current == snapshot:
+            continue
+        # Editors often write a file in several steps; wait until it settles.
+        while True:
+            time.sleep(debounce)
+            settled = {path: file_stamp(path) for path in files}
+            if settled == current:
+                break
+            current = settled
+
+        started = time.perf_counter()
+        try:
+            namespace = load_generator(generator)
+            updated = ebook_fingerprints(namespace, code_fingerprint(generator))
+            changed = [slug for slug, value in updated.items() if fingerprints.get(slug) != value]
+            namespace["generate"](output_dir, slugs=set(changed))
+        except Exception as exc:
+            snapshot = current
+            print(f"Rebuild failed: {exc!r}")
+            continue
+
+        fingerprints = updated
+        files = list(watched_files(generator, namespace))
+        snapshot = {path: file_stamp(path) for path in files}
+        elapsed = (time.perf_counter() - started) * 1000
+        if changed:
+            print(f"Rebuilt {len(changed)} ebook(s) in {elapsed:.0f} ms: {', '.join(changed)}")
+        else:
+            print(f"No ebook inputs changed ({elapsed:.0f} ms).")
@@ -1,12 +1,26 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import argparse
+from dataclasses import dataclass, field
+import hashlib
+from itertools import accumulate
+import mmap
 from pathlib import Path
+import struct
+import sys
 import textwrap
-from typing import List, Tuple
+import unicodedata
+from typing import BinaryIO, Dict, Iterable, List, Set, Tuple, Union
+import zlib
+
+from pdf_charts import bar_chart, series_from_stats, sparkline
+from pdf_fonts import TrueTypeFont, load_truetype
+from pdf_sinks import open_sink
 
 PAGE_W, PAGE_H = 612, 792  # US Letter
 MARGIN = 54
+OUTPUT_DIR = Path("assets/ebooks")
+MEMORY_BUDGET_MB_PER_100_PAGES = 4.0
 
 PALETTE = {
     "bg": "#0b0b0f",
@@ -27,87 +41,430 @@ def hex_to_rgb(hex_color: str) -> Tuple[float, float, float]:
     return tuple(int(hex_color[i : i + 2], 16) / 255 for i in (0, 2, 4))
 
 
+class _WinAnsiTable(dict):
+    # Characters outside WinAnsi fall back to their compatibility decomposition (e.g. "ﬁ" -> "fi",
+    # "ć" -> "c") when that is encodable, otherwise to "?". Results are cached on first use.
+    def __missing__(self, codepoint: int) -> str:
+        decomposed = unicodedata.normalize("NFKD", chr(codepoint))
+        kept = [self[ord(c)] for c in decomposed if ord(c) in self and not unicodedata.combining(c)]
+        self[codepoint] = "".join(kept) if kept and decomposed != chr(codepoint) else "?"
+        return self[codepoint]
+
+
+def _build_winansi_table() -> _WinAnsiTable:
+    # Maps each Unicode character to the latin-1 character whose code equals its WinAnsi byte,
+    # so a translated string encodes to WinAnsi bytes with a plain .encode("latin-1").
+    table = _WinAnsiTable()
+    for byte in range(0x20, 0x100):
+        try:
+            char = bytes([byte]).decode("cp1252")
+        except UnicodeDecodeError:
+            continue
+        if unicodedata.category(char) != "Cc":
+            table[ord(char)] = chr(byte)
+    table.update({ord(c): r for c, r in (("\\", r"\\"), ("(", r"\("), (")", r"\)"))})
+    table.update({ord(c): " " for c in "\n\r\t"})
+    table.update({ord(c): "-" for c in "\u2010\u2011\u2212"})
+    return table
+
+
+WINANSI_TABLE = _build_winansi_table()
+
+
 def escape_pdf_text(text: str) -> str:
-    return (
-        text.replace("\\", r"\\")
-        .replace("(", r"\(")
-        .replace(")", r"\)")
-        .replace("\n", " ")
+    return text.translate(WINANSI_TABLE)
+
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+BYTE_MASK = (0xFF).__and__
+
+
+@dataclass
+class PdfImage:
+    name: str
+    width: int
+    height: int
+    dict_entries: str
+    data: bytes | memoryview | mmap.mmap
+    smask: PdfImage | None = None
+
+
+_IMAGE_CACHE: Dict[Tuple[Path, int, int], PdfImage] = {}
+
+
+def load_image(path: Path) -> PdfImage:
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _IMAGE_CACHE:
+        with path.open("rb") as handle:
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        name = "Im" + hashlib.sha1(data).hexdigest()[:12]
+        if data[:2] == b"\xff\xd8":
+            _IMAGE_CACHE[key] = _jpeg_image(name, data)
+        elif data[:8] == PNG_SIGNATURE:
+            _IMAGE_CACHE[key] = _png_image(name, bytes(data))
+            data.close()
+        else:
+            data.close()
+            raise ValueError(f"Unsupported image format: {path}")
+    return _IMAGE_CACHE[key]
+
+
+def _jpeg_image(name: str, data: mmap.mmap) -> PdfImage:
+    # Walk the marker segments until the frame header; the scan data itself is passed through untouched.
+    pos = 2
+    adobe = False
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("Corrupt JPEG marker stream")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        (seg_len,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        if marker == 0xEE and data[pos + 4 : pos + 9] == b"Adobe":
+            adobe = True
+        if marker in JPEG_SOF_MARKERS:
+            precision, height, width, components = struct.unpack(">BHHB", data[pos + 4 : pos + 10])
+            if components not in JPEG_COLOR_SPACES:
+                raise ValueError(f"Unsupported JPEG component count: {components}")
+            entries = f"/ColorSpace {JPEG_COLOR_SPACES[components]} /BitsPerComponent {precision} /Filter /DCTDecode"
+            if components == 4 and adobe:
+                # CMYK written by Adobe software (flagged by its APP14 segment) is stored inverted.
+                entries += " /Decode [1 0 1 0 1 0 1 0]"
+            return PdfImage(name, width, height, entries, data)
+        pos += 2 + seg_len
+    raise ValueError("JPEG frame header not found")
+
+
+def _png_flate(colors: int, depth: int, width: int) -> str:
+    return f"/Filter /FlateDecode /DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent {depth} /Columns {width} >>"
+
+
+def _png_image(name: str, data: bytes) -> PdfImage:
+    pos = 8
+    header = None
+    palette = b""
+    transparency = b""
+    idat = []
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos : pos + 4])
+        chunk_type = data[pos + 4 : pos + 8]
+        body = data[pos + 8 : pos + 8 + length]
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif chunk_type == b"PLTE":
+            palette = body
+        elif chunk_type == b"tRNS":
+            transparency = body
+        elif chunk_type == b"IDAT":
+            idat.append(body)
+        elif chunk_type == b"IEND":
+            break
+        pos += 12 + length
+    if header is None:
+        raise ValueError("PNG header not found")
+    width, height, depth, color_type, _, _, interlace = header
+    if interlace:
+        raise ValueError("Interlaced PNGs are not supported")
+    channels = PNG_CHANNELS[color_type]
+    compressed = b"".join(idat)
+
+    if color_type in (0, 2, 3):
+        # IDAT is already a zlib stream with PNG row filters, which FlateDecode's predictor 15 understands.
+        if color_type == 3:
+            color_space = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+        else:
+            color_space = "/DeviceGray" if color_type == 0 else "/DeviceRGB"
+        entries = f"/ColorSpace {color_space} /BitsPerComponent {depth} {_png_flate(channels, depth, width)}"
+        smask = None
+        if transparency and color_type == 3:
+            smask = _png_palette_alpha(name + "a", compressed, width, height, depth, transparency)
+        elif transparency:
+            # Gray and RGB tRNS name a single transparent colour, which is exactly a colour-key /Mask.
+            key = struct.unpack(f">{channels}H", transparency[: 2 * channels])
+            entries += f" /Mask [{' '.join(f'{value} {value}' for value in key)}]"
+        return PdfImage(name, width, height, entries, compressed, smask)
+
+    # Gray+alpha and RGBA have to be split into a colour image and a soft mask. PNG filters predict each
+    # byte from the same byte of the previous pixel and row, so the still-filtered rows split cleanly
+    # into colour and alpha lanes that both keep predictor 15; nothing has to be unfiltered here.
+    sample = depth // 8
+    pixel = channels * sample
+    color_bytes = pixel - sample
+    stride = 1 + width * pixel
+    color_stride = 1 + width * color_bytes
+    alpha_stride = 1 + width * sample
+    raw = zlib.decompress(compressed)
+    color = bytearray(color_stride * height)
+    alpha = bytearray(alpha_stride * height)
+    for row in range(height):
+        line = raw[row * stride : (row + 1) * stride]
+        c, a = row * color_stride, row * alpha_stride
+        color[c] = alpha[a] = line[0]
+        for lane in range(color_bytes):
+            color[c + 1 + lane : c + color_stride : color_bytes] = line[1 + lane :: pixel]
+        for lane in range(sample):
+            alpha[a + 1 + lane : a + alpha_stride : sample] = line[1 + color_bytes + lane :: pixel]
+    color_space = "/DeviceGray" if color_type == 4 else "/DeviceRGB"
+    smask = PdfImage(
+        name + "a",
+        width,
+        height,
+        f"/ColorSpace /DeviceGray /BitsPerComponent {depth} {_png_flate(1, depth, width)}",
+        zlib.compress(alpha),
     )
+    entries = f"/ColorSpace {color_space} /BitsPerComponent {depth} {_png_flate(channels - 1, depth, width)}"
+    return PdfImage(name, width, height, entries, zlib.compress(color), smask)
+
+
+def _png_palette_alpha(name: str, compressed: bytes, width: int, height: int, depth: int, transparency: bytes) -> PdfImage:
+    # tRNS holds one alpha per palette entry and may be shorter than the palette; missing entries are opaque.
+    levels = (transparency + b"\xff" * 256)[:256]
+    stride = (width * depth + 7) // 8
+    indices = _png_unfilter(zlib.decompress(compressed), stride, height, 1)
+    if depth == 8:
+        alpha = indices.translate(levels)
+    else:
+        mask = (1 << depth) - 1
+        shifts = range(8 - depth, -1, -depth)
+        # Each packed byte expands to the alpha of every index it holds; rows are cut back to `width` samples.
+        expand = [bytes(levels[(byte >> shift) & mask] for shift in shifts) for byte in range(256)]
+        alpha = b"".join(
+            b"".join(map(expand.__getitem__, indices[row * stride : (row + 1) * stride]))[:width] for row in range(height)
+        )
+    return PdfImage(name, width, height, "/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode", zlib.compress(alpha))
+
+
+def _add_bytes(a: bytes, b: bytes) -> bytes:
+    # Bytewise (a + b) & 0xFF over a whole row at once: add the low seven bits of every byte without
+    # carries between bytes, then xor the top bits back in.
+    n = len(a)
+    low = int.from_bytes(b"\x7f" * n, "big")
+    high = int.from_bytes(b"\x80" * n, "big")
+    x, y = int.from_bytes(a, "big"), int.from_bytes(b, "big")
+    return (((x & low) + (y & low)) ^ ((x ^ y) & high)).to_bytes(n, "big")
+
+
+def _png_unfilter(data: bytes, stride: int, height: int, bpp: int) -> bytearray:
+    out = bytearray(stride * height)
+    prev = bytes(stride)
+    pos = 0
+    for row in range(height):
+        filter_type = data[pos]
+        line = bytearray(data[pos + 1 : pos + 1 + stride])
+        pos += 1 + stride
+        if filter_type == 1:
+            # Sub is a running sum along each byte lane.
+            for lane in range(bpp):
+                line[lane::bpp] = bytes(map(BYTE_MASK, accumulate(line[lane::bpp])))
+        elif filter_type == 2:
+            line[:] = _add_bytes(line, prev)
+        elif filter_type == 3:
+            for i in range(stride):
+                left = line[i - bpp] if i >= bpp else 0
+                line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif filter_type == 4:
+            for i in range(stride):
+                a = line[i - bpp] if i >= bpp else 0
+                b = prev[i]
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predictor = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                line[i] = (line[i] + predictor) & 0xFF
+        out[row * stride : (row + 1) * stride] = line
+        prev = line
+    return out
+
+
+@dataclass(frozen=True)
+class StandardFont:
+    base_font: str
+    object_count = 1
+
+    def encode(self, text: str, used: Dict[int, int]) -> str:
+        return f"({escape_pdf_text(text)})"
+
+    def pdf_objects(self, obj_id: int, used: Dict[int, int]) -> Dict[int, List[bytes]]:
+        return {
+            obj_id: [
+                f"{obj_id} 0 obj << /Type /Font /Subtype /Type1 /BaseFont /{self.base_font} /Encoding /WinAnsiEncoding >> endobj\n".encode("latin-1")
+            ]
+        }
+
+
+Font = Union[StandardFont, TrueTypeFont]
+STANDARD_FONTS: Dict[str, Font] = {"/F1": StandardFont("Helvetica"), "/F2": StandardFont("Helvetica-Bold")}
+
+
+def ebook_fonts(ebook) -> Dict[str, Font]:
+    custom = ebook.get("fonts")
+    if not custom:
+        return STANDARD_FONTS
+    return {"/F1": load_truetype(custom["regular"]), "/F2": load_truetype(custom.get("bold", custom["regular"]))}
 
 
 @dataclass
 class PdfPage:
     ops: List[str]
+    images: Dict[str, PdfImage] = field(default_factory=dict)
+    fonts: Dict[str, Font] = field(default_factory=lambda: dict(STANDARD_FONTS))
+    glyphs: Dict[str, Dict[int, int]] = field(default_factory=dict)
+    _encoded: Dict[bool, bytes] = field(default_factory=dict, repr=False, compare=False)
+
+    def content(self, compress=False) -> bytes:
+        # Variant batches share invariant pages between builders, so each stream is encoded once.
+        if compress not in self._encoded:
+            content = ("\n".join(self.ops) + "\n").encode("latin-1")
+            self._encoded[compress] = zlib.compress(content) if compress else content
+        return self._encoded[compress]
 
 
 class PdfBuilder:
-    def __init__(self, page_size: Tuple[int, int] = (PAGE_W, PAGE_H)):
+    def __init__(self, page_size: Tuple[int, int] = (PAGE_W, PAGE_H), compress=False):
         self.page_w, self.page_h = page_size
         self.pages: List[PdfPage] = []
+        self.compress = compress
+
+    def add_page(
+        self,
+        ops: List[str],
+        images: Dict[str, PdfImage] | None = None,
+        fonts: Dict[str, Font] | None = None,
+        glyphs: Dict[str, Dict[int, int]] | None = None,
+    ):
+        self.pages.append(
+            PdfPage(ops=ops, images=dict(images or {}), fonts=dict(fonts or STANDARD_FONTS), glyphs=dict(glyphs or {}))
+        )
 
-    def add_page(self, ops: List[str]):
-        self.pages.append(PdfPage(ops=ops))
+    def append_page(self, page: PdfPage):
+        self.pages.append(page)
 
     def build(self, output_path: Path):
-        objects = {}
-        objects[1] = "1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
-        objects[2] = (
-            f"2 0 obj << /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in range(3, 3 + len(self.pages)))}] /Count {len(self.pages)} >> endobj\n"
-        )
+        with output_path.open("wb") as out:
+            self.write(out)
+
+    def objects(self) -> Dict[int, List[bytes | memoryview | mmap.mmap]]:
+        objects: Dict[int, List[bytes | memoryview | mmap.mmap]] = {}
+        objects[1] = [b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"]
+        objects[2] = [
+            f"2 0 obj << /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in range(3, 3 + len(self.pages)))}] /Count {len(self.pages)} >> endobj\n".encode("utf-8")
+        ]
 
         page_objects_start = 3
         contents_objects_start = page_objects_start + len(self.pages)
-        font_regular_id = contents_objects_start + len(self.pages)
-        font_bold_id = font_regular_id + 1
+
+        # Embedded fonts are subset to the glyphs used anywhere in this document; resource
+        # names that point at the same font (e.g. a TrueType file used for both weights) share one copy.
+        fonts: Dict[str, Font] = {}
+        for page in self.pages:
+            fonts.update(page.fonts)
+        used: Dict[Font, Dict[int, int]] = {font: {} for font in fonts.values()}
+        for page in self.pages:
+            for name, glyphs in page.glyphs.items():
+                used[page.fonts[name]].update(glyphs)
+        font_ids: Dict[Font, int] = {}
+        next_id = contents_objects_start + len(self.pages)
+        for name in sorted(fonts):
+            if fonts[name] not in font_ids:
+                font_ids[fonts[name]] = next_id
+                next_id += fonts[name].object_count
+        font_refs = " ".join(f"{name} {font_ids[fonts[name]]} 0 R" for name in sorted(fonts))
+
+        # One XObject per distinct image in the document, however many pages draw it.
+        image_ids: Dict[str, int] = {}
+        for page in self.pages:
+            for name, image in page.images.items():
+                if name not in image_ids:
+                    image_ids[name] = next_id
+                    next_id += 2 if image.smask else 1
 
         for i, page in enumerate(self.pages):
             page_obj_id = page_objects_start + i
             content_obj_id = contents_objects_start + i
-            objects[page_obj_id] = (
-                f"{page_obj_id} 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_w} {self.page_h}] "
-                f"/Contents {content_obj_id} 0 R /Resources << /Font << /F1 {font_regular_id} 0 R /F2 {font_bold_id} 0 R >> >> >> endobj\n"
-            )
+            xobjects = ""
+            if page.images:
+                refs = " ".join(f"/{name} {image_ids[name]} 0 R" for name in page.images)
+                xobjects = f" /XObject << {refs} >>"
+            objects[page_obj_id] = [
+                (
+                    f"{page_obj_id} 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_w} {self.page_h}] "
+                    f"/Contents {content_obj_id} 0 R /Resources << /Font << {font_refs} >>{xobjects} >> >> endobj\n"
+                ).encode("utf-8")
+            ]
 
         for i, page in enumerate(self.pages):
             content_obj_id = contents_objects_start + i
-            content = "\n".join(page.ops) + "\n"
-            objects[content_obj_id] = (
-                f"{content_obj_id} 0 obj << /Length {len(content.encode('utf-8'))} >> stream\n{content}endstream endobj\n"
-            )
-
-        objects[font_regular_id] = (
-            f"{font_regular_id} 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n"
-        )
-        objects[font_bold_id] = (
-            f"{font_bold_id} 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >> endobj\n"
-        )
-
-        pdf = "%PDF-1.4\n"
+            content = page.content(self.compress)
+            filters = " /Filter /FlateDecode" if self.compress else ""
+            objects[content_obj_id] = [
+                f"{content_obj_id} 0 obj << /Length {len(content)}{filters} >> stream\n".encode("utf-8"),
+                content,
+                b"\nendstream endobj\n",
+            ]
+
+        for font, obj_id in font_ids.items():
+            objects.update(font.pdf_objects(obj_id, used[font]))
+
+        images = {name: image for page in self.pages for name, image in page.images.items()}
+        for name, obj_id in image_ids.items():
+            image = images[name]
+            smask_ref = ""
+            if image.smask:
+                objects[obj_id + 1] = self._image_object(obj_id + 1, image.smask, "")
+                smask_ref = f" /SMask {obj_id + 1} 0 R"
+            objects[obj_id] = self._image_object(obj_id, image, smask_ref)
+        return objects
+
+    def write(self, out: BinaryIO) -> int:
+        objects = self.objects()
         offsets = {}
         max_id = max(objects.keys())
+        position = out.write(b"%PDF-1.4\n")
         for obj_id in range(1, max_id + 1):
             if obj_id in objects:
-                offsets[obj_id] = len(pdf.encode("utf-8"))
-                pdf += objects[obj_id]
+                offsets[obj_id] = position
+                for chunk in objects[obj_id]:
+                    position += out.write(chunk)
 
-        xref_offset = len(pdf.encode("utf-8"))
-        pdf += f"xref\n0 {max_id + 1}\n"
-        pdf += "0000000000 65535 f \n"
+        xref = [f"xref\n0 {max_id + 1}\n", "0000000000 65535 f \n"]
         for obj_id in range(1, max_id + 1):
             if obj_id in offsets:
-                pdf += f"{offsets[obj_id]:010d} 00000 n \n"
+                xref.append(f"{offsets[obj_id]:010d} 00000 n \n")
             else:
-                pdf += "0000000000 65535 f \n"
-        pdf += f"trailer << /Size {max_id + 1} /Root 1 0 R >>\n"
-        pdf += f"startxref\n{xref_offset}\n%%EOF\n"
-
-        output_path.write_bytes(pdf.encode("utf-8"))
+                xref.append("0000000000 65535 f \n")
+        xref.append(f"trailer << /Size {max_id + 1} /Root 1 0 R >>\n")
+        xref.append(f"startxref\n{position}\n%%EOF\n")
+        return position + out.write("".join(xref).encode("utf-8"))
+
+    @staticmethod
+    def _image_object(obj_id: int, image: PdfImage, extra: str) -> List[bytes | memoryview | mmap.mmap]:
+        return [
+            (
+                f"{obj_id} 0 obj << /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+                f"{image.dict_entries}{extra} /Length {len(image.data)} >> stream\n"
+            ).encode("utf-8"),
+            image.data,
+            b"\nendstream endobj\n",
+        ]
 
 
 class PageBuilder:
-    def __init__(self, accent: str):
+    def __init__(self, accent: str, fonts: Dict[str, Font] = STANDARD_FONTS):
         self.ops: List[str] = []
+        self.images: Dict[str, PdfImage] = {}
+        self.fonts = fonts
+        self.glyphs: Dict[str, Dict[int, int]] = {}
+        # Every string drawn on the page, in drawing order, for the optional full-text index.
+        self.texts: List[str] = []
         self.cursor_y = PAGE_H - MARGIN
         self.accent = accent
         self.draw_rect(0, 0, PAGE_W, PAGE_H, fill=PALETTE["bg"])
@@ -144,12 +501,35 @@ class PageBuilder:
         if color:
             self.set_fill(color)
         font = "/F2" if bold else "/F1"
+        self.texts.append(text)
         self.ops.append("BT")
         self.ops.append(f"{font} {size} Tf")
         self.ops.append(f"{x} {y} Td")
-        self.ops.append(f"({escape_pdf_text(text)}) Tj")
+        self.ops.append(f"{self._encode(font, text)} Tj")
+        self.ops.append("ET")
+
+    def draw_texts(self, runs: List[Tuple[float, float, str]], size=12, color=None, bold=False):
+        # Several same-styled labels share one text object instead of a BT/ET group each.
+        if not runs:
+            return
+        if color:
+            self.set_fill(color)
+        font = "/F2" if bold else "/F1"
+        self.ops.append("BT")
+        self.ops.append(f"{font} {size} Tf")
+        for x, y, text in runs:
+            self.texts.append(text)
+            self.ops.append(f"1 0 0 1 {x:.2f} {y:.2f} Tm {self._encode(font, text)} Tj")
         self.ops.append("ET")
 
+    def _encode(self, font: str, text: str) -> str:
+        return self.fonts[font].encode(text, self.glyphs.setdefault(font, {}))
+
+    def draw_image(self, x, y, w, h, path: Path):
+        image = load_image(path)
+        self.images[image.name] = image
+        self.ops.append(f"q {w} 0 0 {h} {x} {y} cm /{image.name} Do Q")
+
     def add_section_header(self, title: str):
         bar_height = 24
         y = self.cursor_y - bar_height
@@ -180,12 +560,16 @@ class PageBuilder:
 
 
 def build_cover(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.draw_rect(0, PAGE_H - 140, PAGE_W, 140, fill=PALETTE["surface"])
     page.draw_rect(0, PAGE_H - 30, PAGE_W, 30, fill=accent)
+    if ebook.get("logo"):
+        page.draw_image(PAGE_W - MARGIN - 96, PAGE_H - 124, 96, 48, Path(ebook["logo"]))
     page.draw_text(MARGIN, PAGE_H - 90, ebook["title"], size=24, color=PALETTE["ink"], bold=True)
     page.draw_text(MARGIN, PAGE_H - 120, ebook["subtitle"], size=12, color=PALETTE["ink_muted"])
     page.draw_text(MARGIN, PAGE_H - 160, f"{ebook['vendor']} | {ebook['industry']}", size=11, color=PALETTE["ink_soft"])
+    if ebook.get("customer"):
+        page.draw_text(MARGIN, PAGE_H - 180, f"Prepared for {ebook['customer']}", size=11, color=accent, bold=True)
 
     page.cursor_y = PAGE_H - 210
     page.add_section_header("What you will gain")
@@ -194,56 +578,59 @@ def build_cover(ebook, accent):
     page.draw_rect(MARGIN, 90, PAGE_W - 2 * MARGIN, 2, fill=accent)
     page.draw_text(MARGIN, 60, "The Learning Curve", size=12, color=PALETTE["ink"], bold=True)
     page.draw_text(MARGIN, 42, "Keep learning, keep growing.", size=10, color=PALETTE["ink_soft"])
-    return page.ops
+    return page
 
 
 def build_exec_summary(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Executive summary")
     page.add_paragraph(ebook["exec_summary"][0])
     page.add_paragraph(ebook["exec_summary"][1])
     page.add_section_header("Outcome focus")
     page.add_bullets(ebook["outcomes"], size=11)
-    return page.ops
+    return page
 
 
 def build_market_signals(ebook, accent, stats):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Market signals")
     page.add_paragraph("Enterprise learning leaders are investing in AI fluency, cloud modernization, and governance readiness. These signals frame the urgency and scale of adoption across industries.")
     page.add_bullets([f"{s['value']} — {s['label']}" for s in stats], size=10)
 
-    # Simple bar chart
     chart_x = MARGIN
     chart_y = 230
     chart_w = PAGE_W - 2 * MARGIN
     chart_h = 140
     page.draw_rect(chart_x, chart_y, chart_w, chart_h, fill=PALETTE["surface_alt"], stroke=PALETTE["surface_alt"])
-    bar_values = [80, 68, 56, 44]
-    bar_labels = ["AI", "Cloud", "Security", "Data"]
-    bar_width = (chart_w - 80) / len(bar_values)
-    for i, value in enumerate(bar_values):
-        x = chart_x + 30 + i * bar_width
-        height = chart_h * (value / 100)
-        page.draw_rect(x, chart_y, bar_width * 0.5, height, fill=accent)
-        page.draw_text(x, chart_y - 16, bar_labels[i], size=9, color=PALETTE["ink_soft"])
-        page.draw_text(x, chart_y + height + 6, f"{value}%", size=9, color=PALETTE["ink_muted"])
+    labels, series = series_from_stats(stats, accent)
+    bar_chart(
+        page,
+        chart_x,
+        chart_y,
+        chart_w,
+        chart_h,
+        labels,
+        [series],
+        max_value=100,
+        label_color=PALETTE["ink_soft"],
+        value_color=PALETTE["ink_muted"],
+    )
 
     page.draw_text(MARGIN, 200, "Implication", size=11, color=PALETTE["ink"], bold=True)
     page.add_paragraph("Leadership teams need a measurable learning plan that balances speed, governance, and adoption across the enterprise.")
-    return page.ops
+    return page
 
 
 def build_use_cases(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Strategic use cases")
     page.add_paragraph("We prioritize initiatives that deliver executive visibility, measurable value, and rapid adoption.")
     page.add_bullets(ebook["use_cases"], size=11)
-    return page.ops
+    return page
 
 
 def build_capability_map(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Capability map")
     columns = [
         ("People", ebook["capability_people"]),
@@ -266,11 +653,11 @@ def build_capability_map(ebook, accent):
     page.cursor_y = top_y - box_h - 24
     page.add_section_header("Vendor accelerators")
     page.add_bullets(ebook["accelerators"], size=10)
-    return page.ops
+    return page
 
 
 def build_learning_path(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Learning pathway")
     page.add_paragraph("A structured pathway ensures executives, leaders, and practitioners move in lockstep.")
 
@@ -284,11 +671,11 @@ def build_learning_path(ebook, accent):
         page.draw_text(MARGIN + 14, y - 66, phase["duration"], size=9.5, color=PALETTE["ink_soft"])
         y -= box_h + 14
 
-    return page.ops
+    return page
 
 
 def build_cohort_design(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Cohort design")
     page.add_paragraph("Role-based tracks ensure that leaders, managers, and practitioners receive the right depth of enablement.")
 
@@ -304,11 +691,11 @@ def build_cohort_design(ebook, accent):
             y_cursor -= 14
         y -= box_h + 16
 
-    return page.ops
+    return page
 
 
 def build_90_day_plan(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("90-day activation plan")
     page.add_paragraph("A focused 90-day plan connects strategy, learning, and deployment milestones.")
 
@@ -319,19 +706,27 @@ def build_90_day_plan(ebook, accent):
         page.draw_text(MARGIN + 14, y - 46, step["focus"], size=10, color=PALETTE["ink_muted"])
         page.draw_text(MARGIN + 14, y - 64, step["deliverables"], size=9.5, color=PALETTE["ink_soft"])
         y -= 92
-    return page.ops
+    return page
 
 
 def build_kpi_scorecard(ebook, accent):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("KPI scorecard")
     page.add_paragraph("Track adoption, performance, and business impact with a consistent scorecard.")
     page.add_bullets(ebook["kpis"], size=10)
-    return page.ops
+
+    trends = ebook.get("kpi_series")
+    if trends:
+        page.add_section_header("KPI trends")
+        for name, values in trends.items():
+            page.draw_text(MARGIN, page.cursor_y, name, size=10, color=PALETTE["ink_muted"])
+            sparkline(page, PAGE_W - MARGIN - 160, page.cursor_y - 2, 160, 14, values, accent, width=1.5)
+            page.cursor_y -= 24
+    return page
 
 
 def build_sources(ebook, accent, sources):
-    page = PageBuilder(accent)
+    page = PageBuilder(accent, ebook_fonts(ebook))
     page.add_section_header("Sources")
     page.add_bullets(sources, size=9.5)
 
@@ -340,27 +735,31 @@ def build_sources(ebook, accent, sources):
         "The Learning Curve designs instructor-led programs that map directly to business outcomes. We blend vendor-authorized content with custom labs, coaching, and readiness metrics so your teams can adopt faster and scale safely."
     )
     page.add_paragraph("Ready to build a tailored learning journey? Contact us at thelearningcurve.ai or visit thelearningcurve.ai.", size=10)
-    return page.ops
+    return page
 
 
 GLOBAL_STATS = [
     {
         "label": "of workers require training by 2027",
+        "chart_label": "Training need",
         "value": "60%",
         "source": "World Economic Forum Future of Jobs 2023",
     },
     {
         "label": "of worker skills will be disrupted in the next five years",
+        "chart_label": "Skills disrupted",
         "value": "44%",
         "source": "World Economic Forum Future of Jobs 2023",
     },
     {
         "label": "of organizations use AI in at least one function",
+        "chart_label": "AI adoption",
         "value": "78%",
         "source": "McKinsey State of AI 2024",
     },
     {
         "label": "of organizations use generative AI in at least one function",
+        "chart_label": "GenAI adoption",
         "value": "71%",
         "source": "McKinsey State of AI 2024",
     },
@@ -1048,29 +1447,194 @@ EBOOKS = [
 ]
 
 
-def generate():
-    output_dir = Path("assets/ebooks")
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    for ebook in EBOOKS:
-        pdf = PdfBuilder()
-        accent = ebook["accent"]
-        stats = GLOBAL_STATS
+SECTIONS = {
+    "cover": build_cover,
+    "exec_summary": build_exec_summary,
+    "market_signals": lambda ebook, accent: build_market_signals(ebook, accent, GLOBAL_STATS),
+    "use_cases": build_use_cases,
+    "capability_map": build_capability_map,
+    "learning_path": build_learning_path,
+    "cohort_design": build_cohort_design,
+    "90_day_plan": build_90_day_plan,
+    "kpi_scorecard": build_kpi_scorecard,
+    "sources": lambda ebook, accent: build_sources(ebook, accent, SOURCES),
+}
+FULL_SECTIONS = tuple(SECTIONS)
+PREVIEW_SECTIONS = ("cover", "exec_summary")
+
+
+def resolve_sections(names: Iterable[str]) -> Tuple[str, ...]:
+    names = tuple(names)
+    if not names:
+        raise ValueError(f"No sections selected; choose from {', '.join(SECTIONS)}")
+    unknown = [name for name in names if name not in SECTIONS]
+    if unknown:
+        raise ValueError(f"Unknown section(s) {', '.join(unknown)}; choose from {', '.join(SECTIONS)}")
+    return names
+
+
+def section_suffix(sections: Tuple[str, ...]) -> str:
+    # Only the full document may take the published <slug>.pdf name; partial renders get their own files.
+    if sections == FULL_SECTIONS:
+        return ""
+    if sections == PREVIEW_SECTIONS:
+        return "-preview"
+    return "--" + "-".join(sections)
+
+
+def layout_ebook(ebook, compress=False, sections: Iterable[str] = FULL_SECTIONS, text_index=None) -> PdfBuilder:
+    # Only the selected builders run, so a preview never touches the data (or assets) of other sections.
+    pdf = PdfBuilder(compress=compress)
+    accent = ebook["accent"]
+    doc_id = text_index.add_ebook(ebook) if text_index is not None else None
+    for number, name in enumerate(resolve_sections(sections), 1):
+        page = SECTIONS[name](ebook, accent)
+        pdf.add_page(page.ops, page.images, page.fonts, page.glyphs)
+        if text_index is not None:
+            text_index.add_page(doc_id, number, page.texts)
+    return pdf
+
+
+def generate(
+    output_dir: Path = OUTPUT_DIR,
+    slugs: Set[str] | None = None,
+    archive: Path | None = None,
+    compress=False,
+    pipeline_depth: int | None = None,
+    sections: Iterable[str] = FULL_SECTIONS,
+    suffix="",
+    patch=False,
+    text_index_path: Path | None = None,
+):
+    ebooks = [ebook for ebook in EBOOKS if slugs is None or ebook["slug"] in slugs]
+    sections = resolve_sections(sections)
+    text_index = None
+    if text_index_path is not None:
+        from ebook_text_index import TextIndex
+
+        # The index describes the published ebooks, so a preview or section subset must not replace it.
+        if sections != FULL_SECTIONS:
+            raise ValueError("the text index is only written for full renders, not previews or section subsets")
+
+        text_index = TextIndex()
+
+    def layout(ebook):
+        return layout_ebook(ebook, compress, sections, text_index)
+
+    _render(ebooks, layout, output_dir, archive, pipeline_depth, suffix, patch)
+    if text_index is not None:
+        # A slug subset updates its own entries and keeps the rest; a full run replaces the file.
+        text_index.write(text_index_path, merge=slugs is not None)
+
+
+def _render(ebooks, layout, output_dir: Path, archive: Path | None, pipeline_depth: int | None, suffix: str, patch: bool):
+    if patch:
+        from pdf_patch import patch_or_build
+
+        for ebook in ebooks:
+            result = patch_or_build(output_dir / f"{ebook['slug']}{suffix}.pdf", layout(ebook))
+            if result.rebuilt:
+                print(f"{result.path.name}: rebuilt ({result.size} bytes)")
+            elif result.appended:
+                print(
+                    f"{result.path.name}: appended {result.appended} bytes for {len(result.changed)} changed "
+                    f"objects, {len(result.orphaned)} left unreferenced ({result.size} bytes total)"
+                )
+        return
+    sink = open_sink(output_dir, archive)
+    try:
+        if pipeline_depth:
+            from ebook_pipeline import report, run_pipeline
+
+            report(run_pipeline(ebooks, layout, sink, depth=pipeline_depth, suffix=suffix))
+            return
+        for ebook in ebooks:
+            sink.add(f"{ebook['slug']}{suffix}.pdf", layout(ebook))
+    finally:
+        sink.close()
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Generate The Learning Curve ebook PDFs.")
+    parser.add_argument("--watch", action="store_true", help="rebuild ebooks whose inputs change until interrupted")
+    parser.add_argument("--interval", type=float, default=0.25, help="watch polling interval in seconds")
+    parser.add_argument("--verify", action="store_true", help="structurally verify the generated PDFs and fail on the first bad file")
+    parser.add_argument("--archive", type=Path, help="stream all PDFs into this .zip or .tar (plus an offsets index) instead of separate files")
+    parser.add_argument("--compress", action="store_true", help="Flate-compress page content streams")
+    parser.add_argument(
+        "--text-index",
+        nargs="?",
+        type=Path,
+        const=Path("assets/js/ebook-index.json"),
+        metavar="PATH",
+        help="also write a per-page full-text index of the rendered ebooks (default path: assets/js/ebook-index.json)",
+    )
+    parser.add_argument("--patch", action="store_true", help="append only changed objects to existing PDFs as an incremental update")
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        nargs="?",
+        const=2,
+        metavar="DEPTH",
+        help="overlap layout, serialization/compression and output I/O in threads joined by queues of this depth",
+    )
+    parser.add_argument(
+        "--sections",
+        help=f"comma-separated sections to render into <slug>--<sections>.pdf (default: all of {','.join(FULL_SECTIONS)})",
+    )
+    parser.add_argument("--preview", action="store_true", help="render only the cover and executive summary as <slug>-preview.pdf")
+    parser.add_argument("--profile-memory", action="store_true", help="report per-ebook, per-stage memory with tracemalloc")
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=MEMORY_BUDGET_MB_PER_100_PAGES,
+        help="with --profile-memory, fail if peak memory exceeds this many MB per 100 pages",
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile_memory:
+        from memory_profile import profile_memory
+
+        if not profile_memory(EBOOKS, layout_ebook, OUTPUT_DIR, budget_mb_per_100_pages=args.memory_budget):
+            sys.exit(1)
+        return
+
+    if args.watch:
+        from ebook_watch import watch
+
+        try:
+            watch(Path(__file__), OUTPUT_DIR, interval=args.interval)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    sections = PREVIEW_SECTIONS if args.preview else FULL_SECTIONS
+    if args.sections is not None:
+        sections = tuple(name.strip() for name in args.sections.split(",") if name.strip())
+    try:
+        sections = resolve_sections(sections)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.patch and (args.archive or args.pipeline):
+        parser.error("--patch updates PDFs in place and cannot be combined with --archive or --pipeline")
+    if args.text_index and sections != FULL_SECTIONS:
+        parser.error("--text-index indexes the published ebooks and cannot be combined with --preview or --sections")
+    generate(
+        archive=args.archive,
+        compress=args.compress,
+        pipeline_depth=args.pipeline,
+        sections=sections,
+        suffix=section_suffix(sections),
+        patch=args.patch,
+        text_index_path=args.text_index,
+    )
+    print(f"Generated ebooks{f' into {args.archive}' if args.archive else ''}.")
 
-        pdf.add_page(build_cover(ebook, accent))
-        pdf.add_page(build_exec_summary(ebook, accent))
-        pdf.add_page(build_market_signals(ebook, accent, stats))
-        pdf.add_page(build_use_cases(ebook, accent))
-        pdf.add_page(build_capability_map(ebook, accent))
-        pdf.add_page(build_learning_path(ebook, accent))
-        pdf.add_page(build_cohort_design(ebook, accent))
-        pdf.add_page(build_90_day_plan(ebook, accent))
-        pdf.add_page(build_kpi_scorecard(ebook, accent))
-        pdf.add_page(build_sources(ebook, accent, SOURCES))
+    if args.verify and not args.archive:
+        from verify_pdfs import main as verify_main
 
-        pdf.build(output_dir / f"{ebook['slug']}.pdf")
+        verify_main([str(OUTPUT_DIR)])
 
 
 if __name__ == "__main__":
-    generate()
-    print("Generated ebooks.")
+    main()
@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import hashlib
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from pathlib import Path
+import queue
+import sqlite3
+import threading
+import time
+from typing import List
+from urllib import request as urlrequest
+from urllib.parse import urlsplit
+
+DB_PATH = Path("ingest.sqlite3")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    received_at REAL NOT NULL,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    forwarded INTEGER NOT NULL DEFAULT 0,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_pending ON submissions (forwarded, id);
+"""
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL syncs the WAL on every commit, so a 202 means the batch survived a power cut; group commit
+    # is what keeps that to one fsync per batch rather than one per submission.
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(SCHEMA)
+    # Databases created before submissions were de-duplicated lack the digest column.
+    if "digest" not in {row[1] for row in conn.execute("PRAGMA table_info(submissions)")}:
+        conn.execute("ALTER TABLE submissions ADD COLUMN digest TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS submissions_digest ON submissions (digest)")
+    return conn
+
+
+@dataclass
+class Pending:
+    rows: List[tuple]
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Exception | None = None
+
+
+@dataclass
+class Stats:
+    received: int = 0
+    duplicates: int = 0
+    commits: int = 0
+    forwarded: int = 0
+    forward_batches: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                "received": self.received,
+                "duplicates": self.duplicates,
+                "commits": self.commits,
+                "avg_commit_size": round(self.received / self.commits, 2) if self.commits else 0,
+                "forwarded": self.forwarded,
+                "forward_batches": self.forward_batches,
+            }
+
+
+class GroupCommitWriter(threading.Thread):
+    """Collects submissions from all request threads and commits them in shared transactions.
+
+    A batch closes when it reaches max_batch rows or max_delay seconds after its first row,
+    so bursts cost one fsync per batch instead of one per submission.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, stats: Stats, max_batch=500, max_delay=0.005):
+        super().__init__(daemon=True, name="group-commit")
+        self.conn = conn
+        self.stats = stats
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.inbox: queue.Queue[Pending] = queue.Queue()
+
+    def submit(self, rows: List[tuple], timeout=10.0):
+        pending = Pending(rows)
+        self.inbox.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("commit timed out")
+        if pending.error:
+            raise pending.error
+
+    def run(self):
+        while True:
+            batch = [self.inbox.get()]
+            count = len(batch[0].rows)
+            deadline = time.monotonic() + self.max_delay
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.inbox.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item.rows)
+            error = None
+            try:
+                with self.conn:
+                    # A retried submission (same body) is ignored, so retrying after a 503 never stores it twice.
+                    inserted = self.conn.executemany(
+                        "INSERT OR IGNORE INTO submissions (received_at, type, payload, digest) VALUES (?, ?, ?, ?)",
+                        [row for item in batch for row in item.rows],
+                    ).rowcount
+            except sqlite3.Error as exc:
+                error = exc
+            with self.stats.lock:
+                if not error:
+                    self.stats.received += inserted
+                    self.stats.duplicates += count - inserted
+                    self.stats.commits += 1
+            for item in batch:
+                item.error = error
+                item.done.set()
+
+
+class Forwarder(threading.Thread):
+    """Sends committed, unforwarded submissions upstream as JSON arrays."""
+
+    def __init__(self, db_path: Path, stats: Stats, upstream: str, batch_size=1000, interval=1.0, timeout=10.0):
+        super().__init__(daemon=True, name="forwarder")
+        self.db_path = db_path
+        self.stats = stats
+        self.upstream = upstream
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+
+    def run(self):
+        conn = connect(self.db_path)
+        backoff = self.interval
+        while True:
+            rows = conn.execute(
+                "SELECT id, payload FROM submissions WHERE forwarded = 0 ORDER BY id LIMIT ?", (self.batch_size,)
+            ).fetchall()
+            if not rows:
+                time.sleep(self.interval)
+                continue
+            body = ("[" + ",".join(payload for _, payload in rows) + "]").encode("utf-8")
+            req = urlrequest.Request(self.upstream, data=body, headers={"Content-Type": "application/json"}, method="POST")
+            try:
+                with urlrequest.urlopen(req, timeout=self.timeout) as response:
+                    response.read()
+            except OSError as exc:
+                print(f"Forward to {self.upstream} failed ({exc}); retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            backoff = self.interval
+            with conn:
+                conn.execute("UPDATE submissions SET forwarded = 1 WHERE id BETWEEN ? AND ? AND forwarded = 0", (rows[0][0], rows[-1][0]))
+            with self.stats.lock:
+                self.stats.forwarded += len(rows)
+                self.stats.forward_batches += 1
+
+
+def validate(payload) -> tuple:
+    # Same shape app.js posts to the n8n webhook: {type, page, timestamp, data, [cart, total]}.
+    if not isinstance(payload, dict) or not isinstance(payload.get("data"), dict):
+        raise ValueError("payload must be an object with a 'data' object")
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+    return (time.time(), str(payload.get("type") or "lead"), json.dumps(payload, separators=(",", ":")), digest)
+
+
+class IngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Webinar-launch bursts open many connections at once; the default backlog of 5 resets some.
+    request_queue_size = 128
+
+
+def make_handler(writer: GroupCommitWriter, stats: Stats):
+    class IngestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, Nagle + delayed ACK adds ~40 ms per reply.
+        disable_nagle_algorithm = True
+
+        def _reply(self, status: int, body: dict | None = None):
+            data = json.dumps(body).encode("utf-8") if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Access-Control-Allow-Headers", "Content-Type")
+            self.send_header("Access-Control-Allow-Methods", "POST, GET, OPTIONS")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_OPTIONS(self):
+            self._reply(204)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                self._reply(200, stats.as_dict())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # Without a usable length the body cannot be skipped, so the connection is not reused.
+                self.close_connection = True
+                self._reply(400, {"error": "invalid Content-Length"})
+                return
+            try:
+                body = json.loads(self.rfile.read(length) or b"null")
+                # A JSON array is accepted too, so one instance can act as another's bulk upstream.
+                rows = [validate(item) for item in (body if isinstance(body, list) else [body])]
+            except ValueError as exc:
+                self._reply(400, {"error": str(exc)})
+                return
+            try:
+                writer.submit(rows)
+            except (TimeoutError, sqlite3.Error) as exc:
+                # After a timeout the batch may still commit; resending the same body is safe either way.
+                self._reply(503, {"error": str(exc), "retry": "resend the same body; duplicates are ignored"})
+                return
+            self._reply(202, {"accepted": len(rows)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return IngestHandler
+
+
+def serve(args):
+    conn = connect(args.db)
+    stats = Stats()
+    writer = GroupCommitWriter(conn, stats, max_batch=args.max_batch, max_delay=args.max_delay_ms / 1000)
+    writer.start()
+    if args.upstream:
+        Forwarder(args.db, stats, args.upstream, batch_size=args.forward_batch, interval=args.forward_interval).start()
+    server = IngestServer((args.host, args.port), make_handler(writer, stats))
+    print(f"Ingesting on http://{args.host}:{args.port}/ into {args.db}" + (f", forwarding to {args.upstream}" if args.upstream else ""))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(stats.as_dict()))
+
+
+def loadgen(args):
+    target = urlsplit(args.url)
+    path = target.path or "/"
+    counts = [0] * args.concurrency
+    errors = [0] * args.concurrency
+    latencies: List[List[float]] = [[] for _ in range(args.concurrency)]
+    stop_at = time.monotonic() + args.duration
+
+    def worker(n: int):
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=10)
+        seq = 0
+        while time.monotonic() < stop_at:
+            seq += 1
+            payload = {
+                "type": "checkout" if seq % 5 == 0 else "lead",
+                "page": "/contact.html",
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "data": {"name": f"Load {n}-{seq}", "email": f"load{n}.{seq}@example.com", "company": "Load Test"},
+            }
+            body = json.dumps(payload).encode("utf-8")
+            started = time.perf_counter()
+            try:
+                conn.request("POST", path, body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 202
+            except (OSError, http.client.HTTPException):
+                ok = False
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=10)
+            latencies[n].append(time.perf_counter() - started)
+            if ok:
+                counts[n] += 1
+            else:
+                errors[n] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    samples = sorted(value for values in latencies for value in values)
+    total = sum(counts)
+
+    def pct(p: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000 if samples else 0
+
+    print(
+        f"{total} submissions in {elapsed:.1f}s with {args.concurrency} clients: {total / elapsed:.0f}/s sustained, "
+        f"p50 {pct(0.5):.1f} ms, p99 {pct(0.99):.1f} ms, {sum(errors)} errors"
+    )
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Offline stand-in for the n8n contact/checkout webhook.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="accept webhook payloads and batch them into SQLite")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8787)
+    serve_parser.add_argument("--db", type=Path, default=DB_PATH)
+    serve_parser.add_argument("--max-batch", type=int, default=500, help="most submissions per commit")
+    serve_parser.add_argument("--max-delay-ms", type=float, default=5.0, help="longest a submission waits for its batch")
+    serve_parser.add_argument("--upstream", help="URL to forward submissions to in bulk (JSON arrays)")
+    serve_parser.add_argument("--forward-batch", type=int, default=1000)
+    serve_parser.add_argument("--forward-interval", type=float, default=1.0)
+    serve_parser.set_defaults(func=serve)
+
+    load_parser = commands.add_parser("loadgen", help="measure sustained submissions per second")
+    load_parser.add_argument("--url", default="http://127.0.0.1:8787/webhook")
+    load_parser.add_argument("--concurrency", type=int, default=32)
+    load_parser.add_argument("--duration", type=float, default=10.0)
+    load_parser.set_defaults(func=loadgen)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import tracemalloc
+from typing import Callable, Iterable, List
+
+MB = 1024 * 1024
+
+
+@dataclass
+class StageMemory:
+    name: str
+    peak: int
+    retained: int
+
+
+def _stage(name: str, baseline: int, fn: Callable):
+    tracemalloc.reset_peak()
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    return result, StageMemory(name, peak - baseline, current - baseline)
+
+
+def profile_memory(
+    ebooks: Iterable[dict],
+    layout: Callable,
+    output_dir: Path,
+    budget_mb_per_100_pages: float | None = None,
+    top: int = 5,
+) -> bool:
+    """Build each ebook under tracemalloc and print stage peaks and top allocation sites.
+
+    Peaks are measured relative to the memory live before the ebook started, so the shared
+    catalog and caches are not charged to individual ebooks. Returns False if any ebook
+    exceeds the budget.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tracemalloc.start()
+    ok = True
+    try:
+        for ebook in ebooks:
+            before = tracemalloc.take_snapshot()
+            baseline, _ = tracemalloc.get_traced_memory()
+            pdf, layout_stage = _stage("layout", baseline, lambda: layout(ebook))
+            after_layout = tracemalloc.take_snapshot()
+            path = output_dir / f"{ebook['slug']}.pdf"
+            _, build_stage = _stage("serialize+write", baseline, lambda: pdf.build(path))
+            stages: List[StageMemory] = [layout_stage, build_stage]
+
+            pages = len(pdf.pages)
+            peak = max(stage.peak for stage in stages)
+            per_100 = peak / MB / pages * 100 if pages else 0
+            print(f"{ebook['slug']}: {pages} pages, peak {peak / MB:.2f} MB ({per_100:.2f} MB/100 pages)")
+            for stage in stages:
+                print(f"  {stage.name:<16} peak {stage.peak / MB:8.3f} MB  retained {stage.retained / MB:8.3f} MB")
+            print("  top layout allocation sites:")
+            for stat in after_layout.compare_to(before, "lineno")[:top]:
+                frame = stat.traceback[0]
+                print(f"    {frame.filename}:{frame.lineno}  {stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks")
+
+            if budget_mb_per_100_pages is not None and per_100 > budget_mb_per_100_pages:
+                print(f"  FAIL peak {per_100:.2f} MB/100 pages exceeds budget {budget_mb_per_100_pages:.2f}")
+                ok = False
+            del pdf, before, after_layout
+    finally:
+        tracemalloc.stop()
+    return ok
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+from typing import Iterable, List, Sequence, Tuple
+
+NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+@dataclass
+class Series:
+    name: str
+    values: List[float]
+    color: str
+
+
+def parse_value(value: str) -> float:
+    match = NUMBER_RE.search(value.replace(",", ""))
+    if not match:
+        raise ValueError(f"No number in {value!r}")
+    return float(match.group())
+
+
+def series_from_stats(stats: Iterable[dict], color: str, unit: str = "%") -> Tuple[List[str], Series]:
+    # Only stats sharing a unit can sit on one axis, so "$675B" is left out of a percentage chart.
+    picked = [s for s in stats if s["value"].endswith(unit)]
+    labels = [s.get("chart_label", s["label"]) for s in picked]
+    return labels, Series("stats", [parse_value(s["value"]) for s in picked], color)
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _rects(rects: Iterable[Tuple[float, float, float, float]]) -> str:
+    return " ".join(f"{_fmt(x)} {_fmt(y)} {_fmt(w)} {_fmt(h)} re" for x, y, w, h in rects)
+
+
+def _polyline(points: Sequence[Tuple[float, float]]) -> str:
+    head, *tail = points
+    return " ".join([f"{_fmt(head[0])} {_fmt(head[1])} m"] + [f"{_fmt(x)} {_fmt(y)} l" for x, y in tail])
+
+
+def _plotted(labels: Sequence[str], series: Sequence[Series]) -> List[Series]:
+    # Empty series are skipped; the rest must line up with each other and with the labels, if any.
+    plotted = [s for s in series if s.values]
+    lengths = {len(s.values) for s in plotted} | ({len(labels)} if labels else set())
+    if len(lengths) > 1:
+        counts = ", ".join(f"{s.name}={len(s.values)}" for s in plotted)
+        raise ValueError(f"chart series lengths do not match {len(labels)} labels: {counts}")
+    return plotted
+
+
+def _scale(values: Sequence[float], max_value: float | None) -> float:
+    top = max_value if max_value is not None else max(values, default=0)
+    return top if top > 0 else 1
+
+
+def bar_chart(
+    page,
+    x,
+    y,
+    w,
+    h,
+    labels: Sequence[str],
+    series: Sequence[Series],
+    *,
+    stacked=False,
+    max_value=None,
+    label_color=None,
+    value_color=None,
+    value_format="{:g}%",
+    size=9,
+):
+    series = _plotted(labels, series)
+    count = len(labels)
+    if not count or not series:
+        return
+    slot = (w - 60) / count
+    if stacked:
+        totals = [sum(s.values[i] for s in series) for i in range(count)]
+        scale = h / _scale(totals, max_value)
+        bar_w = slot * 0.5
+        base = [0.0] * count
+        for s in series:
+            rects = []
+            for i, value in enumerate(s.values):
+                rects.append((x + 30 + i * slot, y + base[i] * scale, bar_w, value * scale))
+                base[i] += value
+            page.set_fill(s.color)
+            page.ops.append(_rects(rects) + " f")
+        tops = [(x + 30 + i * slot, y + totals[i] * scale + 6, value_format.format(totals[i])) for i in range(count)]
+    else:
+        scale = h / _scale([v for s in series for v in s.values], max_value)
+        bar_w = slot * 0.5 / len(series)
+        tops = []
+        for n, s in enumerate(series):
+            rects = [(x + 30 + i * slot + n * bar_w, y, bar_w, value * scale) for i, value in enumerate(s.values)]
+            page.set_fill(s.color)
+            page.ops.append(_rects(rects) + " f")
+            tops.extend((rx, y + rh + 6, value_format.format(value)) for (rx, _, _, rh), value in zip(rects, s.values))
+
+    page.draw_texts([(x + 30 + i * slot, y - 16, label) for i, label in enumerate(labels)], size=size, color=label_color)
+    if value_color:
+        page.draw_texts(tops, size=size, color=value_color)
+
+
+def line_chart(
+    page,
+    x,
+    y,
+    w,
+    h,
+    labels: Sequence[str],
+    series: Sequence[Series],
+    *,
+    max_value=None,
+    label_color=None,
+    width=1.5,
+    size=9,
+):
+    series = _plotted(labels, series)
+    count = max((len(s.values) for s in series), default=0)
+    if count < 2:
+        return
+    step = (w - 60) / (count - 1)
+    scale = h / _scale([v for s in series for v in s.values], max_value)
+    page.ops.append(f"{_fmt(width)} w")
+    for s in series:
+        page.set_stroke(s.color)
+        points = [(x + 30 + i * step, y + value * scale) for i, value in enumerate(s.values)]
+        page.ops.append(_polyline(points) + " S")
+    if labels:
+        page.draw_texts([(x + 30 + i * step, y - 16, label) for i, label in enumerate(labels)], size=size, color=label_color)
+
+
+def sparkline(page, x, y, w, h, values: Sequence[float], color: str, width=1):
+    if len(values) < 2:
+        return
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    step = w / (len(values) - 1)
+    points = [(x + i * step, y + (value - low) / span * h) for i, value in enumerate(values)]
+    page.set_stroke(color)
+    page.ops.append(f"{_fmt(width)} w")
+    page.ops.append(_polyline(points) + " S")
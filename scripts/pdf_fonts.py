@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+import struct
+from typing import Dict, Iterable, List, Set, Tuple
+import zlib
+
+# Hinting tables are kept so subset glyphs render the same as in the full font.
+SUBSET_TABLES = ("cvt ", "fpgm", "prep")
+
+COMPOSITE_ARGS_ARE_WORDS = 0x0001
+COMPOSITE_HAVE_SCALE = 0x0008
+COMPOSITE_MORE_COMPONENTS = 0x0020
+COMPOSITE_HAVE_XY_SCALE = 0x0040
+COMPOSITE_HAVE_2X2 = 0x0080
+
+
+def _checksum(data: bytes) -> int:
+    padded = data + b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(padded) // 4}I", padded)) & 0xFFFFFFFF
+
+
+class TrueTypeFont:
+    """A parsed TrueType font embedded as Type0/CIDFontType2 with Identity-H encoding.
+
+    Glyph IDs are used as CIDs, so subsetting only blanks out unused glyphs instead of
+    renumbering them. Parsed tables, glyph closures and finished subsets are cached on the
+    instance, and instances are shared process-wide through load_truetype().
+    """
+
+    object_count = 5
+
+    def __init__(self, path: Path):
+        self.path = path
+        data = path.read_bytes()
+        self.data = data
+        num_tables = struct.unpack(">H", data[4:6])[0]
+        self.tables: Dict[str, Tuple[int, int]] = {}
+        for i in range(num_tables):
+            tag, _, offset, length = struct.unpack(">4sIII", data[12 + i * 16 : 28 + i * 16])
+            self.tables[tag.decode("latin-1")] = (offset, length)
+
+        head = self.table("head")
+        self.units_per_em = struct.unpack(">H", head[18:20])[0]
+        self.bbox = struct.unpack(">hhhh", head[36:44])
+        loca_format = struct.unpack(">h", head[50:52])[0]
+        self.num_glyphs = struct.unpack(">H", self.table("maxp")[4:6])[0]
+        hhea = self.table("hhea")
+        self.ascent, self.descent = struct.unpack(">hh", hhea[4:8])
+        self.num_hmetrics = struct.unpack(">H", hhea[34:36])[0]
+        self.italic_angle = struct.unpack(">i", self.table("post")[4:8])[0] / 65536 if "post" in self.tables else 0
+        self.cap_height = self.ascent
+        if "OS/2" in self.tables:
+            os2 = self.table("OS/2")
+            if struct.unpack(">H", os2[0:2])[0] >= 2 and len(os2) >= 90:
+                self.cap_height = struct.unpack(">h", os2[88:90])[0]
+
+        hmtx = self.table("hmtx")
+        advances = list(struct.unpack(f">{self.num_hmetrics * 2}H", hmtx[: self.num_hmetrics * 4])[::2])
+        advances += [advances[-1]] * (self.num_glyphs - self.num_hmetrics)
+        self.advances = advances
+        self.hmtx = hmtx
+
+        loca = self.table("loca")
+        if loca_format == 0:
+            self.loca = [v * 2 for v in struct.unpack(f">{self.num_glyphs + 1}H", loca[: (self.num_glyphs + 1) * 2])]
+        else:
+            self.loca = list(struct.unpack(f">{self.num_glyphs + 1}I", loca[: (self.num_glyphs + 1) * 4]))
+        self.glyf = self.table("glyf")
+
+        self.cmap = self._parse_cmap()
+        self.ps_name = self._parse_name(6) or path.stem.replace(" ", "")
+        self._codes: Dict[str, Tuple[int, str]] = {}
+        self._closures: Dict[int, frozenset] = {}
+        self._subsets: Dict[frozenset, Tuple[str, bytes, int]] = {}
+
+    def table(self, tag: str) -> bytes:
+        offset, length = self.tables[tag]
+        return self.data[offset : offset + length]
+
+    def _parse_cmap(self) -> Dict[int, int]:
+        cmap = self.table("cmap")
+        count = struct.unpack(">H", cmap[2:4])[0]
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack(">HHI", cmap[4 + i * 8 : 12 + i * 8])
+            subtables[(platform, encoding)] = offset
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            if key in subtables:
+                offset = subtables[key]
+                fmt = struct.unpack(">H", cmap[offset : offset + 2])[0]
+                if fmt == 12:
+                    return self._cmap_format12(cmap, offset)
+                if fmt == 4:
+                    return self._cmap_format4(cmap, offset)
+        raise ValueError(f"No Unicode cmap in {self.path}")
+
+    @staticmethod
+    def _cmap_format4(cmap: bytes, offset: int) -> Dict[int, int]:
+        seg_count = struct.unpack(">H", cmap[offset + 6 : offset + 8])[0] // 2
+        ends_at = offset + 14
+        starts_at = ends_at + seg_count * 2 + 2
+        deltas_at = starts_at + seg_count * 2
+        ranges_at = deltas_at + seg_count * 2
+        ends = struct.unpack(f">{seg_count}H", cmap[ends_at : ends_at + seg_count * 2])
+        starts = struct.unpack(f">{seg_count}H", cmap[starts_at : starts_at + seg_count * 2])
+        deltas = struct.unpack(f">{seg_count}h", cmap[deltas_at : deltas_at + seg_count * 2])
+        ranges = struct.unpack(f">{seg_count}H", cmap[ranges_at : ranges_at + seg_count * 2])
+        mapping = {}
+        for seg in range(seg_count):
+            for code in range(starts[seg], ends[seg] + 1):
+                if code == 0xFFFF:
+                    break
+                if ranges[seg] == 0:
+                    gid = (code + deltas[seg]) & 0xFFFF
+                else:
+                    at = ranges_at + seg * 2 + ranges[seg] + (code - starts[seg]) * 2
+                    gid = struct.unpack(">H", cmap[at : at + 2])[0]
+                    if gid:
+                        gid = (gid + deltas[seg]) & 0xFFFF
+                if gid:
+                    mapping[code] = gid
+        return mapping
+
+    @staticmethod
+    def _cmap_format12(cmap: bytes, offset: int) -> Dict[int, int]:
+        groups = struct.unpack(">I", cmap[offset + 12 : offset + 16])[0]
+        mapping = {}
+        for i in range(groups):
+            start, end, gid = struct.unpack(">III", cmap[offset + 16 + i * 12 : offset + 28 + i * 12])
+            for code in range(start, end + 1):
+                mapping[code] = gid + code - start
+        return mapping
+
+    def _parse_name(self, name_id: int) -> str | None:
+        if "name" not in self.tables:
+            return None
+        name = self.table("name")
+        count, storage = struct.unpack(">HH", name[2:6])
+        for i in range(count):
+            platform, _, _, nid, length, offset = struct.unpack(">HHHHHH", name[6 + i * 12 : 18 + i * 12])
+            if nid != name_id:
+                continue
+            raw = name[storage + offset : storage + offset + length]
+            text = raw.decode("utf-16-be") if platform in (0, 3) else raw.decode("latin-1")
+            return "".join(c for c in text if c.isalnum() or c in "-_")
+        return None
+
+    def encode(self, text: str, used: Dict[int, int]) -> str:
+        codes = self._codes
+        parts = []
+        for char in text:
+            code = codes.get(char)
+            if code is None:
+                gid = self.cmap.get(ord(char if char not in "\n\r\t" else " "), 0)
+                code = codes[char] = (gid, f"{gid:04X}")
+            used[code[0]] = ord(char)
+            parts.append(code[1])
+        return "<" + "".join(parts) + ">"
+
+    def _glyph_closure(self, gid: int) -> frozenset:
+        # Composite glyphs reference other glyphs, which must survive subsetting too.
+        if gid in self._closures:
+            return self._closures[gid]
+        closure = {gid}
+        start, end = self.loca[gid], self.loca[gid + 1]
+        glyph = self.glyf[start:end]
+        if len(glyph) >= 10 and struct.unpack(">h", glyph[:2])[0] < 0:
+            pos = 10
+            while True:
+                flags, component = struct.unpack(">HH", glyph[pos : pos + 4])
+                closure |= self._glyph_closure(component)
+                pos += 4 + (4 if flags & COMPOSITE_ARGS_ARE_WORDS else 2)
+                if flags & COMPOSITE_HAVE_SCALE:
+                    pos += 2
+                elif flags & COMPOSITE_HAVE_XY_SCALE:
+                    pos += 4
+                elif flags & COMPOSITE_HAVE_2X2:
+                    pos += 8
+                if not flags & COMPOSITE_MORE_COMPONENTS:
+                    break
+        self._closures[gid] = frozenset(closure)
+        return self._closures[gid]
+
+    def subset(self, gids: Iterable[int]) -> Tuple[str, bytes, int]:
+        """Return (subset tag, zlib-compressed font file, uncompressed length) for the glyphs."""
+        wanted = frozenset(gid for gid in gids if gid < self.num_glyphs) | {0}
+        if wanted not in self._subsets:
+            keep: Set[int] = set()
+            for gid in wanted:
+                keep |= self._glyph_closure(gid)
+            self._subsets[wanted] = self._build_subset(keep)
+        return self._subsets[wanted]
+
+    def _build_subset(self, keep: Set[int]) -> Tuple[str, bytes, int]:
+        count = max(keep) + 1
+        glyf = bytearray()
+        offsets = []
+        for gid in range(count):
+            offsets.append(len(glyf))
+            if gid in keep:
+                glyf += self.glyf[self.loca[gid] : self.loca[gid + 1]]
+                glyf += b"\0" * (-len(glyf) % 4)
+        offsets.append(len(glyf))
+
+        metrics = min(count, self.num_hmetrics)
+        hmtx = self.hmtx[: metrics * 4] + self.hmtx[self.num_hmetrics * 4 :][: (count - metrics) * 2]
+        head = bytearray(self.table("head"))
+        head[8:12] = b"\0\0\0\0"
+        head[50:52] = struct.pack(">h", 1)
+        hhea = bytearray(self.table("hhea"))
+        hhea[34:36] = struct.pack(">H", metrics)
+        maxp = bytearray(self.table("maxp"))
+        maxp[4:6] = struct.pack(">H", count)
+
+        tables = {
+            "glyf": bytes(glyf),
+            "head": bytes(head),
+            "hhea": bytes(hhea),
+            "hmtx": hmtx,
+            "loca": struct.pack(f">{count + 1}I", *offsets),
+            "maxp": bytes(maxp),
+        }
+        for tag in SUBSET_TABLES:
+            if tag in self.tables:
+                tables[tag] = self.table(tag)
+
+        font, offsets = self._assemble(tables)
+        adjustment = (0xB1B0AFBA - _checksum(font)) & 0xFFFFFFFF
+        head_at = offsets["head"]
+        font[head_at + 8 : head_at + 12] = struct.pack(">I", adjustment)
+
+        digest = hashlib.sha1(repr(sorted(keep)).encode("ascii")).digest()
+        tag = "".join(chr(ord("A") + b % 26) for b in digest[:6])
+        return tag, zlib.compress(bytes(font)), len(font)
+
+    @staticmethod
+    def _assemble(tables: Dict[str, bytes]) -> Tuple[bytearray, Dict[str, int]]:
+        count = len(tables)
+        power = 1
+        while power * 2 <= count:
+            power *= 2
+        search_range = power * 16
+        header = struct.pack(">IHHHH", 0x00010000, count, search_range, power.bit_length() - 1, count * 16 - search_range)
+        directory = bytearray()
+        body = bytearray()
+        offsets = {}
+        for tag in sorted(tables):
+            data = tables[tag]
+            offsets[tag] = 12 + 16 * count + len(body)
+            directory += struct.pack(">4sIII", tag.encode("latin-1"), _checksum(data), offsets[tag], len(data))
+            body += data + b"\0" * (-len(data) % 4)
+        return bytearray(header) + directory + body, offsets
+
+    def _widths(self, gids: List[int]) -> str:
+        scale = 1000 / self.units_per_em
+        runs: List[Tuple[int, List[str]]] = []
+        for gid in gids:
+            width = f"{round(self.advances[gid] * scale)}"
+            if runs and runs[-1][0] + len(runs[-1][1]) == gid:
+                runs[-1][1].append(width)
+            else:
+                runs.append((gid, [width]))
+        return " ".join(f"{start} [{' '.join(widths)}]" for start, widths in runs)
+
+    @staticmethod
+    def _to_unicode(used: Dict[int, int]) -> bytes:
+        lines = [
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+        ]
+        items = sorted(used.items())
+        for i in range(0, len(items), 100):
+            block = items[i : i + 100]
+            lines.append(f"{len(block)} beginbfchar")
+            lines.extend(f"<{gid:04X}> <{chr(cp).encode('utf-16-be').hex().upper()}>" for gid, cp in block)
+            lines.append("endbfchar")
+        lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+        return ("\n".join(lines) + "\n").encode("ascii")
+
+    def pdf_objects(self, obj_id: int, used: Dict[int, int]) -> Dict[int, List[bytes]]:
+        tag, font_file, length1 = self.subset(used)
+        base_font = f"{tag}+{self.ps_name}"
+        scale = 1000 / self.units_per_em
+        bbox = " ".join(str(round(v * scale)) for v in self.bbox)
+        flags = 32 | (64 if self.italic_angle else 0)
+        to_unicode = self._to_unicode(used)
+        return {
+            obj_id: [
+                (
+                    f"{obj_id} 0 obj << /Type /Font /Subtype /Type0 /BaseFont /{base_font} /Encoding /Identity-H "
+                    f"/DescendantFonts [{obj_id + 1} 0 R] /ToUnicode {obj_id + 4} 0 R >> endobj\n"
+                ).encode("latin-1")
+            ],
+            obj_id + 1: [
+                (
+                    f"{obj_id + 1} 0 obj << /Type /Font /Subtype /CIDFontType2 /BaseFont /{base_font} "
+                    f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                    f"/FontDescriptor {obj_id + 2} 0 R /CIDToGIDMap /Identity /W [{self._widths(sorted(used))}] >> endobj\n"
+                ).encode("latin-1")
+            ],
+            obj_id + 2: [
+                (
+                    f"{obj_id + 2} 0 obj << /Type /FontDescriptor /FontName /{base_font} /Flags {flags} "
+                    f"/FontBBox [{bbox}] /ItalicAngle {self.italic_angle:g} /Ascent {round(self.ascent * scale)} "
+                    f"/Descent {round(self.descent * scale)} /CapHeight {round(self.cap_height * scale)} /StemV 80 "
+                    f"/FontFile2 {obj_id + 3} 0 R >> endobj\n"
+                ).encode("latin-1")
+            ],
+            obj_id + 3: [
+                f"{obj_id + 3} 0 obj << /Length {len(font_file)} /Length1 {length1} /Filter /FlateDecode >> stream\n".encode("latin-1"),
+                font_file,
+                b"\nendstream endobj\n",
+            ],
+            obj_id + 4: [
+                f"{obj_id + 4} 0 obj << /Length {len(to_unicode)} >> stream\n".encode("latin-1"),
+                to_unicode,
+                b"\nendstream endobj\n",
+            ],
+        }
+
+
+_FONT_CACHE: Dict[Path, TrueTypeFont] = {}
+
+
+def load_truetype(path: Path) -> TrueTypeFont:
+    path = Path(path).resolve()
+    if path not in _FONT_CACHE:
+        _FONT_CACHE[path] = TrueTypeFont(path)
+    return _FONT_CACHE[path]
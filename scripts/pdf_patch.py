@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import mmap
+from pathlib import Path
+import struct
+import sys
+import tempfile
+from typing import Dict, List
+
+from verify_pdfs import read_xref_chain, trailer_int
+
+
+# Once a patched file would be this much larger than a fresh build, it is rebuilt instead.
+MAX_GROWTH = 0.5
+
+
+@dataclass
+class PatchResult:
+    path: Path
+    appended: int
+    size: int
+    changed: List[int]
+    orphaned: List[int]
+    rebuilt: bool = False
+
+
+def _unchanged(data, offset: int, chunks) -> bool:
+    for chunk in chunks:
+        end = offset + len(chunk)
+        # bytes never compare equal to an mmap (JPEG data is passed through as one), so compare buffers.
+        if memoryview(data)[offset:end] != memoryview(chunk):
+            return False
+        offset = end
+    return True
+
+
+def _xref_sections(entries: Dict[int, str]) -> List[str]:
+    lines: List[str] = []
+    ids = sorted(entries)
+    start = 0
+    for i in range(1, len(ids) + 1):
+        if i == len(ids) or ids[i] != ids[i - 1] + 1:
+            run = ids[start:i]
+            lines.append(f"{run[0]} {len(run)}\n")
+            lines.extend(entries[obj_id] for obj_id in run)
+            start = i
+    return lines
+
+
+def fresh_size(objects: Dict[int, list]) -> int:
+    """Approximate size of `objects` written from scratch: header, object bytes and a 20-byte xref entry each."""
+    body = sum(len(chunk) for chunks in objects.values() for chunk in chunks)
+    return 9 + body + 20 * (max(objects) + 1) + 64
+
+
+def patch_pdf(path: Path, pdf) -> PatchResult:
+    """Bring an existing PDF up to date with `pdf` by appending an incremental update.
+
+    Only objects whose bytes differ from the file's current version are appended, followed by
+    an xref section chained to the previous one with /Prev. The original bytes are never
+    rewritten, so the cost (and the sync delta) is proportional to what actually changed.
+
+    Objects the new layout no longer uses are left in place, unreferenced, rather than freed:
+    every object keeps generation 0, so a later layout can reuse its number without bumping
+    generations in every reference to it. Raises ValueError when the file cannot be patched
+    that way (an id it already marks free, or growth past MAX_GROWTH), so the caller rebuilds.
+    """
+    objects = pdf.objects()
+    with path.open("r+b") as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offsets, trailer, startxref = read_xref_chain(data)
+            size = trailer_int(trailer, b"Size") or 0
+            changed = [
+                obj_id
+                for obj_id, chunks in sorted(objects.items())
+                if obj_id not in offsets or not _unchanged(data, offsets[obj_id], chunks)
+            ]
+            orphaned = sorted(obj_id for obj_id in offsets if obj_id not in objects)
+            ends_with_newline = data[-1:] == b"\n"
+            position = len(data)
+        if not changed:
+            return PatchResult(path, 0, position, [], orphaned)
+        reused = [obj_id for obj_id in changed if obj_id not in offsets and obj_id < size]
+        if reused:
+            raise ValueError(f"object {reused[0]} is marked free in the file and cannot be reused at generation 0")
+        appended = sum(len(chunk) for obj_id in changed for chunk in objects[obj_id]) + 20 * len(changed) + 128
+        limit = int(fresh_size(objects) * (1 + MAX_GROWTH))
+        if position + appended > limit:
+            raise ValueError(f"patched file would grow past {limit} bytes")
+
+        handle.seek(position)
+        start = position
+        if not ends_with_newline:
+            position += handle.write(b"\n")
+        entries: Dict[int, str] = {}
+        for obj_id in changed:
+            entries[obj_id] = f"{position:010d} 00000 n \n"
+            for chunk in objects[obj_id]:
+                position += handle.write(chunk)
+
+        xref = ["xref\n", *_xref_sections(entries)]
+        xref.append(f"trailer << /Size {max(size, max(objects) + 1)} /Root 1 0 R /Prev {startxref} >>\n")
+        xref.append(f"startxref\n{position}\n%%EOF\n")
+        position += handle.write("".join(xref).encode("utf-8"))
+    return PatchResult(path, position - start, position, changed, orphaned)
+
+
+def patch_or_build(path: Path, pdf) -> PatchResult:
+    """Patch `path` in place if it is a readable PDF, otherwise (or once patching stops paying off) write it from scratch."""
+    if path.exists():
+        try:
+            return patch_pdf(path, pdf)
+        except ValueError as exc:
+            print(f"{path}: not patching ({exc}); rebuilding")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pdf.build(path)
+    size = path.stat().st_size
+    return PatchResult(path, size, size, [], [], rebuilt=True)
+
+
+def _check_jpeg(path: Path):
+    # SOI, a baseline frame header for a 1x1 grayscale image, EOI: enough for the pass-through JPEG loader.
+    path.write_bytes(b"\xff\xd8" + struct.pack(">HHBHHBBBB", 0xFFC0, 11, 8, 1, 1, 1, 1, 0x11, 0) + b"\xff\xd9")
+
+
+def check_idempotent(ebooks, layout, workdir: Path) -> List[str]:
+    """Build each ebook, then patch it twice with the same layout; neither patch may append anything."""
+    failures = []
+    for ebook in ebooks:
+        path = workdir / f"{ebook['slug']}.pdf"
+        layout(ebook).build(path)
+        for attempt in (1, 2):
+            result = patch_or_build(path, layout(ebook))
+            if result.appended or result.rebuilt:
+                failures.append(f"{path.name}: patch {attempt} appended {result.appended} bytes for objects {result.changed}")
+                break
+    return failures
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Check that patching an unchanged ebook appends nothing.")
+    parser.add_argument("--slug", action="append", help="ebook to check (default: all)")
+    args = parser.parse_args(argv)
+
+    import generate_ebooks
+
+    ebooks = [ebook for ebook in generate_ebooks.EBOOKS if not args.slug or ebook["slug"] in args.slug]
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        logo = workdir / "logo.jpg"
+        _check_jpeg(logo)
+        # Run every ebook as-is and again with a JPEG logo, whose data is passed through as an mmap.
+        ebooks += [{**ebook, "logo": str(logo), "slug": ebook["slug"] + "-jpeg"} for ebook in ebooks]
+        failures = check_idempotent(ebooks, generate_ebooks.layout_ebook, workdir)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(f"Patched {len(ebooks)} unchanged PDFs twice; nothing appended.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import io
+import json
+from pathlib import Path
+import tarfile
+import time
+from typing import BinaryIO, List
+import zipfile
+
+
+class _SequentialWriter:
+    """File wrapper that counts bytes and refuses to seek, so archives are written front to back."""
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self.position = 0
+
+    def write(self, data) -> int:
+        written = self.fp.write(data)
+        self.position += written
+        return written
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, *args):
+        raise OSError("sequential writer cannot seek")
+
+    def flush(self):
+        self.fp.flush()
+
+
+class DirectorySink:
+    """Writes each PDF as its own file (the default output)."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def add(self, name: str, pdf):
+        pdf.build(self.directory / name)
+
+    def close(self):
+        pass
+
+
+class _ArchiveSink:
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.fp = path.open("wb")
+        self.out = _SequentialWriter(self.fp)
+        self.entries: List[dict] = []
+
+    def _record(self, name: str, offset: int, size: int):
+        self.entries.append({"name": name, "offset": offset, "size": size})
+
+    def _write_index(self, archive_format: str):
+        # Offsets point at the raw PDF bytes, so one file can be fetched with a single range read.
+        index = {"archive": self.path.name, "format": archive_format, "entries": self.entries}
+        self.path.with_name(self.path.name + ".index.json").write_text(json.dumps(index, indent=2) + "\n", encoding="utf-8")
+
+
+class ZipSink(_ArchiveSink):
+    """Streams each PDF into a stored (uncompressed) zip entry as it is serialized."""
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        # An unseekable target makes zipfile use data descriptors instead of patching headers.
+        self.zip = zipfile.ZipFile(self.out, "w", compression=zipfile.ZIP_STORED)
+
+    def add(self, name: str, pdf):
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        with self.zip.open(info, "w", force_zip64=False) as entry:
+            offset = self.out.position
+            pdf.write(entry)
+        self._record(name, offset, info.file_size)
+
+    def close(self):
+        self.zip.close()
+        self.fp.close()
+        self._write_index("zip")
+
+
+class TarSink(_ArchiveSink):
+    """Appends each PDF to an uncompressed tar; tar headers need the size, so each PDF is buffered in memory."""
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.tar = tarfile.open(fileobj=self.out, mode="w", format=tarfile.PAX_FORMAT)
+
+    def add(self, name: str, pdf):
+        buffer = io.BytesIO()
+        size = pdf.write(buffer)
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        buffer.seek(0)
+        self.tar.addfile(info, buffer)
+        self._record(name, self.tar.offset - size - (-size % tarfile.BLOCKSIZE), size)
+
+    def close(self):
+        self.tar.close()
+        self.fp.close()
+        self._write_index("tar")
+
+
+def open_sink(output_dir: Path, archive: Path | None = None):
+    if archive is None:
+        return DirectorySink(output_dir)
+    if archive.suffix == ".zip":
+        return ZipSink(archive)
+    if archive.suffix == ".tar":
+        return TarSink(archive)
+    raise ValueError(f"Unsupported archive type {archive.suffix!r}; use .zip or .tar")
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+import mmap
+from pathlib import Path
+import re
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+
+OBJ_RE = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+REF_RE = re.compile(rb"(\d+)\s+(\d+)\s+R\b")
+LENGTH_RE = re.compile(rb"/Length\s+(\d+)(?:\s+(\d+)\s+R\b)?")
+STARTXREF_RE = re.compile(rb"startxref\s+(\d+)\s+%%EOF\s*$")
+XREF_SECTION_RE = re.compile(rb"(\d+)\s+(\d+)\s*\r?\n")
+XREF_ENTRY_RE = re.compile(rb"(\d{10}) (\d{5}) ([nf])[ \r\n]{2}")
+TRAILER_RE = re.compile(rb"trailer\s*<<(.*?)>>\s*startxref", re.S)
+STREAM_EOL_RE = re.compile(rb"stream\r?\n")
+# At most one EOL may sit between the data and endstream, so a /Length that is short by even one byte fails.
+ENDSTREAM_RE = re.compile(rb"(?:\r\n|\r|\n)?endstream\s+endobj")
+ROOT_RE = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R\b")
+INT_OBJECT_RE = re.compile(rb"\d+\s+\d+\s+obj\s+(\d+)\s+endobj")
+
+
+class PdfVerifyError(ValueError):
+    pass
+
+
+def _read_xref(data, offset: int) -> Tuple[Dict[int, int | None], bytes]:
+    if data[offset : offset + 4] != b"xref":
+        raise PdfVerifyError(f"xref offset {offset} does not point at an xref table")
+    entries: Dict[int, int | None] = {}
+    pos = offset + 4
+    while pos < len(data) and data[pos] in b" \r\n":
+        pos += 1
+    while data[pos : pos + 7] != b"trailer":
+        section = XREF_SECTION_RE.match(data, pos)
+        if not section:
+            raise PdfVerifyError(f"malformed xref subsection header at {pos}")
+        first, count = int(section.group(1)), int(section.group(2))
+        pos = section.end()
+        for obj_id in range(first, first + count):
+            entry = XREF_ENTRY_RE.match(data, pos)
+            if not entry:
+                raise PdfVerifyError(f"malformed xref entry for object {obj_id}")
+            # Free entries are kept (as None) so a newer section can delete an object from an older one.
+            entries[obj_id] = int(entry.group(1)) if entry.group(3) == b"n" else None
+            pos = entry.end()
+    trailer = TRAILER_RE.match(data, pos)
+    if not trailer:
+        raise PdfVerifyError(f"missing trailer after xref at {offset}")
+    return entries, trailer.group(1)
+
+
+def trailer_int(trailer: bytes, key: bytes) -> int | None:
+    match = re.search(rb"/" + key + rb"\s+(\d+)", trailer)
+    return int(match.group(1)) if match else None
+
+
+def read_xref_chain(data) -> Tuple[Dict[int, int], bytes, int]:
+    """Return the newest offset of every live object, the newest trailer and the startxref offset."""
+    tail = STARTXREF_RE.search(data, max(0, len(data) - 1024))
+    if not tail:
+        raise PdfVerifyError("missing startxref/%%EOF")
+
+    # Follow /Prev so incrementally updated files are checked against their newest xref entries.
+    offsets: Dict[int, int | None] = {}
+    newest_trailer = None
+    startxref = xref_at = int(tail.group(1))
+    seen = set()
+    while xref_at is not None:
+        if xref_at in seen:
+            raise PdfVerifyError("xref /Prev chain loops")
+        seen.add(xref_at)
+        entries, trailer = _read_xref(data, xref_at)
+        for obj_id, offset in entries.items():
+            offsets.setdefault(obj_id, offset)
+        newest_trailer = newest_trailer or trailer
+        xref_at = trailer_int(trailer, b"Prev")
+    return {obj_id: offset for obj_id, offset in offsets.items() if offset is not None}, newest_trailer, startxref
+
+
+def verify_pdf(path: Path):
+    """Check xref offsets, stream lengths, trailer/startxref and references; raise PdfVerifyError."""
+    if path.stat().st_size == 0:
+        raise PdfVerifyError("empty file")
+    with path.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:5] != b"%PDF-":
+            raise PdfVerifyError("missing %PDF- header")
+        offsets, newest_trailer, _ = read_xref_chain(data)
+
+        size = trailer_int(newest_trailer, b"Size")
+        if size is None or size <= max(offsets, default=0):
+            raise PdfVerifyError(f"trailer /Size {size} does not cover object {max(offsets, default=0)}")
+        root = ROOT_RE.search(newest_trailer)
+        if not root or int(root.group(1)) not in offsets:
+            raise PdfVerifyError("trailer /Root is missing or unresolved")
+
+        headers: List[Tuple[int, bytes]] = []
+        for obj_id, offset in offsets.items():
+            match = OBJ_RE.match(data, offset)
+            if not match or int(match.group(1)) != obj_id:
+                raise PdfVerifyError(f"xref offset {offset} for object {obj_id} does not land on '{obj_id} 0 obj'")
+            end = data.find(b"endobj", match.end())
+            stream_at = data.find(b"stream", match.end(), end if end != -1 else len(data))
+            if end == -1:
+                raise PdfVerifyError(f"object {obj_id} has no endobj")
+            header = data[match.end() : stream_at if stream_at != -1 else end]
+            headers.append((obj_id, header))
+            if stream_at == -1:
+                continue
+            length_match = LENGTH_RE.search(header)
+            if not length_match:
+                raise PdfVerifyError(f"stream object {obj_id} has no /Length")
+            length = int(length_match.group(1))
+            if length_match.group(2) is not None:
+                length = _indirect_length(data, offsets, int(length_match.group(1)))
+            eol = STREAM_EOL_RE.match(data, stream_at)
+            if not eol or not ENDSTREAM_RE.match(data, eol.end() + length):
+                raise PdfVerifyError(f"stream object {obj_id} /Length {length} does not end at endstream")
+
+        for obj_id, header in headers:
+            for ref in REF_RE.finditer(header):
+                if int(ref.group(1)) not in offsets:
+                    raise PdfVerifyError(f"object {obj_id} references missing object {ref.group(1).decode()}")
+
+
+def _indirect_length(data, offsets: Dict[int, int], obj_id: int) -> int:
+    if obj_id not in offsets:
+        raise PdfVerifyError(f"/Length references missing object {obj_id}")
+    match = INT_OBJECT_RE.match(data, offsets[obj_id])
+    if not match:
+        raise PdfVerifyError(f"/Length object {obj_id} is not an integer")
+    return int(match.group(1))
+
+
+def _verify_batch(paths: List[Path]) -> int:
+    for path in paths:
+        try:
+            verify_pdf(path)
+        except (PdfVerifyError, OSError) as exc:
+            # Unreadable files are reported as failures like malformed ones, not as a traceback.
+            raise PdfVerifyError(f"{path}: {exc}") from None
+    return len(paths)
+
+
+def collect(targets: Iterable[Path]) -> List[Path]:
+    paths = []
+    for target in targets:
+        paths.extend(sorted(target.rglob("*.pdf")) if target.is_dir() else [target])
+    return paths
+
+
+def verify_all(paths: List[Path], workers: int | None = None, batch_size=64) -> int:
+    """Verify files in parallel batches, stopping at the first bad file."""
+    batches = [paths[i : i + batch_size] for i in range(0, len(paths), batch_size)]
+    if len(batches) <= 1:
+        return sum(_verify_batch(batch) for batch in batches)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_verify_batch, batch) for batch in batches]
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        for future in pending:
+            future.cancel()
+        for future in done:
+            future.result()
+        return sum(future.result() for future in futures)
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Structurally verify generated PDFs.")
+    parser.add_argument("paths", nargs="*", type=Path, default=[Path("assets/ebooks")], help="PDF files or directories")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        count = verify_all(collect(args.paths), workers=args.workers)
+    except PdfVerifyError as exc:
+        print(f"FAIL {exc}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+    print(f"Verified {count} PDFs in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f} files/s).")
+
+
+if __name__ == "__main__":
+    main()